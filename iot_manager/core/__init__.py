@@ -1,4 +1,6 @@
-from ._datatypes import IOTDevice
+from ._datatypes import EndpointData, IOTDevice, PollEngine, PollSpread
 from ._device_buffer import DeviceBuffer
 from ._device_manager import DeviceManager
 from ._http_server import HTTPServer
+from ._shared_store import SharedStore, SharedStoreView
+from ._sharded_buffer import ShardedDeviceBuffer
@@ -0,0 +1,82 @@
+"""
+Demand driven poll intervals.
+
+| ``Path``: iot_manager/core/_adaptive_rate.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import typing as tp
+
+
+class AdaptiveRate:
+    """
+    Poll interval of a single endpoint, derived from how often it's read.
+
+    The time between reads is averaged with an exponential moving average.
+    The interval follows that average, clamped to ``[floor, ceiling]``:
+    polling faster than the data is read doesn't give any reader fresher
+    data. Once reads stop, the time since the last read takes over, so an
+    endpoint nobody reads anymore backs off to the ceiling.
+
+    :cvar _smoothing: weight of the newest gap in the moving average.
+
+    :ivar floor: shortest allowed interval in seconds.
+    :ivar ceiling: longest allowed interval in seconds.
+    :ivar _avg_gap: average seconds between reads, None before two reads.
+    :ivar _last_read: monotonic time of the last read, None if never read.
+    """
+
+    # region ClassVars
+    _smoothing: tp.ClassVar[float] = 0.2
+    # endregion
+
+    # region InstanceVars
+    floor: float
+    ceiling: float
+    _avg_gap: float | None
+    _last_read: float | None
+    # endregion
+
+    def __init__(self, floor: float, ceiling: float) -> None:
+        if floor > ceiling:
+            msg = f"Interval floor is larger than ceiling! ({floor=}, {ceiling=})"
+            raise ValueError(msg)
+
+        self.floor = floor
+        self.ceiling = ceiling
+        self._avg_gap = None
+        self._last_read = None
+
+    def record_read(self, now: float) -> float:
+        """
+        Count a read of the endpoint.
+
+        :param now: current monotonic time.
+        :return: the new poll interval.
+        """
+        if self._last_read is not None:
+            gap = now - self._last_read
+
+            if self._avg_gap is None:
+                self._avg_gap = gap
+
+            else:
+                self._avg_gap += self._smoothing * (gap - self._avg_gap)
+
+        self._last_read = now
+        return self.interval(now)
+
+    def interval(self, now: float) -> float:
+        """
+        Current poll interval.
+
+        :param now: current monotonic time.
+        :return: interval in seconds.
+        """
+        if self._last_read is None:
+            return self.ceiling
+
+        gap = max(self._avg_gap or 0, now - self._last_read)
+        return min(max(gap, self.floor), self.ceiling)
@@ -0,0 +1,143 @@
+"""
+Asyncio based HTTP client for polling devices.
+
+| ``Path``: iot_manager/core/_async_poller.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import asyncio
+import ipaddress
+import typing as tp
+
+import aiohttp
+
+from ..utils.debugging import debugger
+
+
+class AsyncPoller:
+    """
+    Shared keep-alive connection pool for device requests.
+
+    aiohttp keeps one pool of idle connections per host inside the
+    connector, so consecutive polls of the same device reuse the same
+    TCP connection instead of reconnecting every time.
+
+    :cvar _keepalive_timeout: seconds an idle connection is kept open.
+
+    :ivar _max_concurrency: max. number of requests in flight (all hosts).
+    :ivar _max_per_host: max. number of open connections per device,
+        0 leaves the limit to the devices ``max_parallel`` setting.
+    :ivar _session: lazily created client session.
+    """
+
+    # region ClassVars
+    _keepalive_timeout: tp.ClassVar[float] = 60
+    # endregion
+
+    # region InstanceVars
+    _max_concurrency: int
+    _max_per_host: int
+    _session: aiohttp.ClientSession | None
+    # endregion
+
+    def __init__(self, max_concurrency: int = 256, max_per_host: int = 0) -> None:
+        self._max_concurrency = max_concurrency
+        self._max_per_host = max_per_host
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the client session, create it on first use.
+
+        The session has to be created from within the running loop.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._max_concurrency,
+                limit_per_host=self._max_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+
+        return self._session
+
+    async def get_json(
+        self,
+        address: tuple[ipaddress.IPv4Address, int],
+        endpoint: str,
+        timeout: float,
+    ) -> tp.Any:
+        """
+        Request a single endpoint and decode the response.
+
+        :param address: device (ip, port).
+        :param endpoint: endpoint to request.
+        :param timeout: total request timeout in seconds.
+        :return: decoded json data.
+        """
+        session = self._get_session()
+
+        async with session.get(
+            f"http://{address[0]}:{address[1]}/{endpoint}",
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            # devices don't always set the content type correctly
+            return await response.json(content_type=None)
+
+    async def send_json(
+        self,
+        method: str,
+        address: tuple[ipaddress.IPv4Address, int],
+        endpoint: str,
+        body: tp.Any,
+        timeout: float,
+    ) -> tuple[int, bytes]:
+        """
+        Send a json body to an endpoint.
+
+        :param method: request method, e.g. "POST".
+        :param address: device (ip, port).
+        :param endpoint: endpoint to send to.
+        :param body: json serializable body.
+        :param timeout: total request timeout in seconds.
+        :return: response status and body.
+        """
+        session = self._get_session()
+
+        async with session.request(
+            method,
+            f"http://{address[0]}:{address[1]}/{endpoint}",
+            json=body,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            return response.status, await response.read()
+
+    async def close(self) -> None:
+        """Close all pooled connections."""
+        if self._session is not None and not self._session.closed:
+            debugger.trace("async_poller: closing session")
+            await self._session.close()
+
+            # give the transports time to close
+            await asyncio.sleep(0)
+
+        self._session = None
+
+    def close_sync(self) -> None:
+        """
+        Close all pooled connections without awaiting, for when the
+        loop the session was used on is already closed.
+        """
+        if self._session is not None and not self._session.closed:
+            debugger.trace("async_poller: closing session (sync)")
+            connector = self._session.connector
+            self._session.detach()
+
+            # what `connector.close` does before scheduling its wait on
+            # the (closed) loop
+            if connector is not None:
+                connector._close()
+
+        self._session = None
@@ -0,0 +1,136 @@
+"""
+Per-device circuit breaker.
+
+| ``Path``: iot_manager/core/_circuit_breaker.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import random
+import threading
+import time
+import typing as tp
+
+from ._datatypes import DeviceHealth
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive request failures of a device.
+
+    After ``_open_after`` consecutive failures the circuit opens and no
+    requests are made until the (jittered, exponentially growing) backoff
+    has passed. Then a single probe request is let through, success closes
+    the circuit again, failure doubles the backoff.
+
+    :cvar _open_after: consecutive failures until the circuit opens.
+    :cvar _base_backoff: backoff in seconds after opening the first time.
+    :cvar _max_backoff: upper limit for the backoff in seconds.
+
+    :ivar _state: current health state.
+    :ivar _failures: consecutive failures.
+    :ivar _backoff: current (un-jittered) backoff in seconds.
+    :ivar _retry_at: monotonic time the next probe is allowed at.
+    :ivar _lock: guards the state, requests may finish on any thread.
+    """
+
+    # region ClassVars
+    _open_after: tp.ClassVar[int] = 3
+    _base_backoff: tp.ClassVar[float] = 2
+    _max_backoff: tp.ClassVar[float] = 300
+    # endregion
+
+    # region InstanceVars
+    _state: DeviceHealth
+    _failures: int
+    _backoff: float
+    _retry_at: float
+    _lock: threading.Lock
+    # endregion
+
+    def __init__(self) -> None:
+        self._state = DeviceHealth.HEALTHY
+        self._failures = 0
+        self._backoff = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        # locks can't be pickled, e.g. when sent between processes
+        state = self.__dict__.copy()
+        state.pop("_lock")
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> DeviceHealth:
+        return self._state
+
+    @property
+    def retry_at(self) -> float:
+        return self._retry_at
+
+    def allow_request(self, now: float) -> bool:
+        """
+        Check if a request to the device may be made.
+
+        :param now: current monotonic time.
+        :return: False while the circuit is open and backing off.
+        """
+        return self._state != DeviceHealth.OPEN or now >= self._retry_at
+
+    def record_success(self) -> DeviceHealth:
+        """
+        Mark a request as successful, closes the circuit.
+
+        :return: state before the success.
+        """
+        with self._lock:
+            previous = self._state
+
+            self._state = DeviceHealth.HEALTHY
+            self._failures = 0
+            self._backoff = 0
+            self._retry_at = 0
+
+        return previous
+
+    def record_failure(self, now: float) -> DeviceHealth:
+        """
+        Mark a request as failed, may open the circuit.
+
+        :param now: current monotonic time.
+        :return: new state.
+        """
+        with self._lock:
+            self._failures += 1
+
+            if self._failures < self._open_after:
+                self._state = DeviceHealth.DEGRADED
+                return self._state
+
+            # opened for the first time or failed probe
+            if self._state != DeviceHealth.OPEN or now >= self._retry_at:
+                self._backoff = min(
+                    max(self._backoff * 2, self._base_backoff),
+                    self._max_backoff,
+                )
+                self._retry_at = now + self._backoff * random.uniform(0.5, 1)
+
+            self._state = DeviceHealth.OPEN
+            return self._state
+
+    def to_dict(self) -> dict:
+        """
+        :return: json serializable state.
+        """
+        return {
+            "state": self._state.name,
+            "failures": self._failures,
+            "backoff": self._backoff,
+            "retry_in": max(self._retry_at - time.monotonic(), 0),
+        }
@@ -0,0 +1,95 @@
+"""
+Per-device queue of write requests.
+
+| ``Path``: iot_manager/core/_command_queue.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import asyncio
+import typing as tp
+from collections import deque
+from dataclasses import dataclass, field
+
+from ._datatypes import EndpointType
+
+
+@dataclass(slots=True)
+class Command:
+    """A pending write, may stand for multiple merged writes."""
+
+    endpoint: str
+    method: EndpointType
+    body: tp.Any
+    result: asyncio.Future = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+    merged: int = 0  # writes replaced by this one
+
+
+class CommandQueue:
+    """
+    Writes of a single device, sent one after another.
+
+    PUT requests are idempotent, so a PUT queued right after a PUT to
+    the same endpoint replaces it instead of sending both. All callers of the
+    merged writes get the result of the one that's actually sent.
+
+    :ivar _pending: commands waiting to be sent, oldest first.
+    :ivar running: if a task is sending the queued commands.
+    """
+
+    # region InstanceVars
+    _pending: deque[Command]
+    running: bool
+    # endregion
+
+    def __init__(self) -> None:
+        self._pending = deque()
+        self.running = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, endpoint: str, method: EndpointType, body: tp.Any) -> Command:
+        """
+        Queue a write, merges it with the last queued command if that's a
+        PUT to the same endpoint.
+
+        :param endpoint: endpoint to write to.
+        :param method: request method (POST or PUT).
+        :param body: json body.
+        :return: the queued command, await its ``result``.
+        """
+        # only the last one, merging past other commands would reorder
+        # the writes
+        if method == EndpointType.PUT and self._pending:
+            last = self._pending[-1]
+            if last.endpoint == endpoint and last.method == method:
+                last.body = body
+                last.merged += 1
+                return last
+
+        command = Command(endpoint, method, body)
+        self._pending.append(command)
+        return command
+
+    def pop(self) -> Command | None:
+        """
+        :return: the oldest command, None if there are none.
+        """
+        if not self._pending:
+            return None
+
+        return self._pending.popleft()
+
+    def clear(self) -> list[Command]:
+        """
+        Remove all queued commands.
+
+        :return: the removed commands.
+        """
+        commands = list(self._pending)
+        self._pending.clear()
+        return commands
@@ -11,6 +11,7 @@ Nilusink
 import ipaddress
 from dataclasses import dataclass
 from enum import Enum
+from types import EllipsisType
 
 
 class EndpointType(Enum):
@@ -21,6 +22,36 @@ class EndpointType(Enum):
     PUT = 2
 
 
+class PollEngine(Enum):
+    """Specify how the device buffer polls its devices."""
+
+    THREADED = 0  # requests in a thread pool
+    ASYNC = 1  # aiohttp on the servers event loop
+
+
+class BackpressurePolicy(Enum):
+    """Specify what happens to a poll that can't be started right away."""
+
+    DROP = 0  # skip the poll, wait for the next interval
+    COALESCE = 1  # run one poll as soon as the device / queue is free
+
+
+class PollSpread(Enum):
+    """Specify how polls of different devices are spread over time."""
+
+    NONE = 0  # all devices start at once
+    PHASE = 1  # fixed per-device offset into the interval
+    JITTER = 2  # random first poll and bounded random jitter on every poll
+
+
+class DeviceHealth(Enum):
+    """Reachability of a device."""
+
+    HEALTHY = 0
+    DEGRADED = 1  # some requests failed recently
+    OPEN = 2  # unreachable, only probed after a backoff
+
+
 @dataclass(frozen=True)
 class IOTDevice:
     """IOT device info."""
@@ -37,5 +68,26 @@ class IOTDevice:
         }
 
 
+@dataclass(frozen=True, slots=True)
+class EndpointData:
+    """Buffered data of a single endpoint, replaced as a whole on update."""
+
+    data: dict | EllipsisType = ...  # ... if never received
+    encoded: bytes | None = None
+    etag: str | None = None
+    updated_at: float | None = None  # unix time
+    seq: int = 0  # change sequence number, 0 if never changed
+    stale: bool = False  # restored from a snapshot, not polled since
+    duration: float | None = None  # seconds the request took
+
+    @property
+    def started_at(self) -> float | None:
+        """unix time the request was started at"""
+        if self.updated_at is None or self.duration is None:
+            return None
+
+        return self.updated_at - self.duration
+
+
 if __name__ == "__main__":
     print(EndpointType.GET.name)
@@ -10,44 +10,271 @@ Author:
 Nilusink
 """
 
+import asyncio
+import hashlib
+import json
+import os
+import random
+import secrets
+import threading
 import time
 import typing as tp
+from collections import deque
 from types import EllipsisType
 from concurrent.futures import Future, ThreadPoolExecutor
 
+import aiohttp
 import requests
 
-from ..utils.debugging import debugger  # , DebugLevel  # , run_with_debug
-from ._datatypes import IOTDevice, EndpointType
+from ..utils.debugging import debugger, profiler  # , DebugLevel
+from ._adaptive_rate import AdaptiveRate
+from ._async_poller import AsyncPoller
+from ._circuit_breaker import CircuitBreaker
+from ._command_queue import Command, CommandQueue
+from ._datatypes import (
+    BackpressurePolicy,
+    DeviceHealth,
+    EndpointData,
+    EndpointType,
+    IOTDevice,
+    PollEngine,
+    PollSpread,
+)
+from ._history import EndpointHistory
+from ._metrics import LATENESS_BUCKETS, EndpointStats, Histogram, MetricsWriter
+from ._registry import Registry
+from ._scheduler import DeadlineScheduler
+from ._shared_store import SharedStore
+from ._snapshot import SnapshotRecord, read_snapshot, write_snapshot
+from ._subscriptions import Subscription, SubscriptionHub, Topic
 
 
 class _DeviceParams(tp.TypedDict):
     device: IOTDevice
     interval: float
+    max_parallel: int
     last_update: float
-    last_data: dict[str, dict | EllipsisType]
+    data: dict[str, EndpointData]
+    next_due: dict[str, float]
+    polled_at: dict[str, float]
+    queued: set[str]
+    rates: dict[str, AdaptiveRate] | None
+    history: dict[str, EndpointHistory]
+    in_flight: bool
+    pending: bool
+    skipped: int
+    health: CircuitBreaker
+    commands: CommandQueue
+    stats: dict[str, EndpointStats]
+
+
+class BatchItem(tp.TypedDict):
+    device_id: int | None
+    endpoint: str | None
+    # "too_large": only from `SharedStoreView`, see `SharedStore.put`
+    status: tp.Literal["ok", "no_data", "not_found", "too_large"]
+    age: float | None
+    etag: str | None
+    stale: bool
+    fetched_at: float | None
+    fetch_started: float | None
+    fetch_duration: float | None
 
 
 class DeviceBuffer:
-    _clients: dict[int, _DeviceParams]
+    _clients: Registry[int, _DeviceParams]
     _current_client_id = 0
+    _probe_timeout = 1
+    _due_slack = 0.05
+    _golden_ratio = 0.6180339887498949
 
     def __init__(
         self,
+        engine: PollEngine = PollEngine.THREADED,
+        max_concurrency: int = 256,
+        max_pending: int = 64,
+        backpressure: BackpressurePolicy = BackpressurePolicy.COALESCE,
+        on_demand: bool = False,
+        spread: PollSpread = PollSpread.NONE,
+        max_jitter: float = 0.1,
+        snapshot_path: str | None = None,
+        snapshot_interval: float = 60,
+        shared_store: SharedStore | None = None,
+        max_commands: int = 16,
     ) -> None:
+        """
+        :param engine: threaded (requests) or async (aiohttp) polling
+        :param max_concurrency: max. requests in flight (async engine only)
+        :param max_pending: max. device updates queued or running at once
+        :param backpressure: what to do with polls that can't be started
+            because the device is still updating or the queue is full
+        :param on_demand: allow readers to request missing or stale
+            endpoints right away, see `fetch_device_data`
+        :param spread: how polls of different devices are spread over
+            their interval to avoid request bursts
+        :param max_jitter: max. jitter as fraction of the interval
+            (`PollSpread.JITTER` only), 0 <= max_jitter < 1
+        :param snapshot_path: file the buffered data is saved to every
+            `snapshot_interval` seconds and on shutdown. Data of an
+            existing snapshot is served (marked stale) until the devices
+            were polled again.
+        :param snapshot_interval: seconds between snapshots
+        :param shared_store: store all data is written to as well, for
+            `HTTPServer` workers in other processes
+        :param max_commands: max. commands sent at once (all devices),
+            see `send_command`
+        :raises ValueError: if `max_jitter` is out of range
+        """
+        # the interval would become zero or negative
+        if not 0 <= max_jitter < 1:
+            raise ValueError("max_jitter must be >= 0 and < 1")
+
         debugger.trace("dev_buf: initializing...")
 
-        # variable setup
-        self._clients = {}
+        # variable setup, the registry is never modified, only replaced
+        self._clients = Registry()
+        self._registry_lock = threading.Lock()
+        self._engine = engine
         self.__running = True
 
+        # scheduling
+        self._scheduler = DeadlineScheduler()
+        self._wakeup = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._async_wakeup: asyncio.Event | None = None
+        self._spread = spread
+        self._max_jitter = max_jitter
+
+        # backpressure
+        self._max_pending = max_pending
+        self._backpressure = backpressure
+        self._n_in_flight = 0
+        self._skipped_polls = 0
+        self._backlog: deque[int] = deque()
+        self._lock = threading.Lock()
+
         # threading
         self._pool = ThreadPoolExecutor(max_workers=8)
 
+        # asyncio
+        self._poller = AsyncPoller(max_concurrency=max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+        # on demand requests, (device id, endpoint): running request
+        self._on_demand = on_demand
+        self._fetches: dict[tuple[int, str], asyncio.Future] = {}
+
+        # push updates
+        self._subscriptions = SubscriptionHub()
+
+        # delta queries, (device id, endpoint): sequence number of the
+        # last change, ordered by sequence number. removed endpoints stay
+        # in it (and `_removed`) until they're added again. sequence
+        # numbers restart with every instance, which the epoch tells
+        # clients
+        self._seq = 0
+        self._changes: dict[tuple[int, str], int] = {}
+        self._removed: set[tuple[int, str]] = set()
+        self._epoch = (
+            secrets.token_hex(8) if shared_store is None
+            else shared_store.epoch
+        )
+
+        # warm restart, (device id, endpoint): data of the last snapshot
+        # for devices that weren't added yet
+        self._snapshot_path = snapshot_path
+        self._snapshot_interval = snapshot_interval
+        self._next_snapshot = time.monotonic() + snapshot_interval
+        self._snapshot_lock = threading.Lock()
+        self._restored: dict[tuple[int, str], SnapshotRecord] = {}
+
+        if snapshot_path is not None:
+            self._load_snapshot(snapshot_path)
+
+        # multi process serving
+        self._shared_store = shared_store
+
+        # writes, always sent using the pooled async connections (on the
+        # loop of the first command for the threaded engine)
+        self._command_slots = asyncio.Semaphore(max_commands)
+        self._command_loop: asyncio.AbstractEventLoop | None = None
+
         # start background threads
-        self._pool.submit(self._device_requester)
+        if engine == PollEngine.THREADED:
+            self._pool.submit(self._device_requester)
+
+        debugger.log(f"dev_buf: initialized ({engine.name.lower()} engine)")
+
+    @property
+    def engine(self) -> PollEngine:
+        return self._engine
+
+    @property
+    def on_demand(self) -> bool:
+        return self._on_demand
+
+    @property
+    def shared_store(self) -> SharedStore | None:
+        return self._shared_store
+
+    @property
+    def epoch(self) -> str:
+        """
+        id of this buffer instance, sequence numbers (see `get_changes`)
+        of different epochs can't be compared
+        """
+        return self._epoch
+
+    @property
+    def in_flight(self) -> int:
+        """
+        number of device updates currently queued or running
+        """
+        return self._n_in_flight
+
+    @property
+    def skipped_polls(self) -> int:
+        """
+        number of polls dropped or coalesced because of backpressure
+        """
+        return self._skipped_polls
+
+    async def run(self) -> None:
+        """
+        polling loop of the async engine, run it on the same loop as
+        the http server. returns immediately for the threaded engine.
+        """
+        if self._engine != PollEngine.ASYNC:
+            return
+
+        debugger.trace("dev_buf: starting async device requester")
+
+        self._loop = asyncio.get_running_loop()
+        self._async_wakeup = asyncio.Event()
+
+        try:
+            while self.__running:
+                self._async_wakeup.clear()
+
+                self._dispatch_due_devices()
+
+                # sleep until the next device is due or the schedule changes
+                try:
+                    await asyncio.wait_for(
+                        self._async_wakeup.wait(),
+                        self._time_until_next_deadline(),
+                    )
+
+                except TimeoutError:
+                    pass
 
-        debugger.log("dev_buf: initialized")
+        finally:
+            # wait for running requests before closing the connections
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+
+            await self._poller.close()
+            debugger.trace("dev_buf: async device requester stopped")
 
     def _device_requester(self) -> None:
         """
@@ -56,96 +283,840 @@ class DeviceBuffer:
         debugger.trace("dev_buf: starting device requester")
 
         while self.__running:
-            now = time.time()
-            for did, device in self._clients.items():
-                # check if device data needs to be updated
-                if (now - device["last_update"]) > device["interval"]:
-                    self._update_device(did, True)
-                    device["last_update"] = time.time()
+            self._wakeup.clear()
+
+            self._dispatch_due_devices()
 
-            time.sleep(0.1)
+            # sleep until the next device is due or the schedule changes
+            self._wakeup.wait(self._time_until_next_deadline())
 
         debugger.trace("dev_buf: device requester stopped")
 
-    # @run_with_debug(
-    #     show_call=True,
-    #     show_finish=True,
-    #     reraise_errors=True,
-    # )
-    def _update_device(self, device_id: int, background: bool = True) -> None | Future:
+    @profiler.span()
+    def _dispatch_due_devices(self) -> None:
+        """
+        take all due devices from the schedule, reschedule them and
+        start their updates
+        """
+        now = time.monotonic()
+        to_start = []
+
+        for did, due in self._scheduler.pop_due(now):
+            device = self._clients.get(did)
+
+            # device was removed
+            if device is None:
+                continue
+
+            # unreachable device, wait for the backoff to pass
+            if not device["health"].allow_request(now):
+                self._scheduler.schedule(did, device["health"].retry_at)
+                continue
+
+            with self._lock:
+                next_due = self._queue_due_endpoints(device, now)
+                self._scheduler.schedule(did, next_due)
+
+                if device["queued"] and self._try_reserve(did, device):
+                    to_start.append(did)
+
+        for did in to_start:
+            self._launch_update(did)
+
+        # disk io mustn't delay the polls
+        if self._snapshot_path is not None and now >= self._next_snapshot:
+            self._next_snapshot = now + self._snapshot_interval
+            self._pool.submit(self.save_snapshot)
+
+    def _queue_due_endpoints(self, device: _DeviceParams, now: float) -> float:
+        """
+        queue all due endpoints of a device for its next update and
+        reschedule them (lock must be held)
+
+        :returns: when the device is due next
+        """
+        next_due = device["next_due"]
+
+        # same jitter for all endpoints, so they stay together
+        jitter = 0.0
+        if self._spread == PollSpread.JITTER:
+            jitter = random.uniform(-self._max_jitter, self._max_jitter)
+
+        for endpoint, due in next_due.items():
+            # endpoints due at about the same time are requested together
+            if due > now + self._due_slack:
+                continue
+
+            interval = self._endpoint_interval(device, endpoint, now)
+            interval += jitter * interval
+
+            # keep the original phase, unless we're already behind
+            due += interval
+            if due <= now:
+                due = now + interval
+
+            next_due[endpoint] = due
+            device["polled_at"][endpoint] = now
+            device["queued"].add(endpoint)
+
+        return min(next_due.values(), default=now + device["interval"])
+
+    def _first_poll_offset(self, device_id: int, interval: float) -> float:
+        """
+        delay of a newly added devices first poll
+
+        :param device_id: the new device
+        :param interval: the devices interval
+        :returns: seconds from now
+        """
+        match self._spread:
+            case PollSpread.PHASE:
+                # consecutive ids end up evenly spread over the interval
+                return (device_id * self._golden_ratio) % 1 * interval
+
+            case PollSpread.JITTER:
+                return random.uniform(0, interval)
+
+        return 0
+
+    @staticmethod
+    def _endpoint_interval(
+        device: _DeviceParams,
+        endpoint: str,
+        now: float,
+    ) -> float:
+        """
+        current poll interval of an endpoint
+        """
+        if device["rates"] is None:
+            return device["interval"]
+
+        return device["rates"][endpoint].interval(now)
+
+    def _try_reserve(self, device_id: int, device: _DeviceParams) -> bool:
+        """
+        mark a device as in flight if it isn't already and the queue has
+        room, otherwise skip or coalesce the poll (lock must be held)
+
+        :returns: True if the update should be started
+        """
+        if not device["in_flight"] and self._n_in_flight < self._max_pending:
+            device["in_flight"] = True
+            device["pending"] = False
+            self._n_in_flight += 1
+            return True
+
+        self._skipped_polls += 1
+        device["skipped"] += 1
+
+        if self._backpressure == BackpressurePolicy.COALESCE:
+            # remember a single follow-up poll
+            if not device["pending"]:
+                device["pending"] = True
+                self._backlog.append(device_id)
+
+        debugger.trace(
+            "dev_buf: skipped poll of device %s (%s)",
+            device_id,
+            "busy" if device["in_flight"] else "queue full",
+        )
+        return False
+
+    def _launch_update(self, device_id: int) -> None:
+        """
+        start an update of a device that has been reserved using
+        `_try_reserve`, calls `_finish_update` once it's done
+        """
+        if not self.__running:
+            self._finish_update(device_id)
+            return
+
+        with self._lock:
+            device = self._clients.get(device_id)
+            endpoints = []
+
+            if device is not None:
+                # keep the devices endpoint order
+                endpoints = [
+                    ep for ep in device["next_due"] if ep in device["queued"]
+                ]
+                device["queued"].clear()
+
+        if self._engine == PollEngine.ASYNC:
+            task = asyncio.create_task(
+                self._run_update_async(device_id, endpoints)
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            return
+
+        try:
+            futures = self._update_device(device_id, True, endpoints)
+
+        except (KeyError, RuntimeError):
+            # device removed or pool already shut down
+            self._finish_update(device_id)
+            return
+
+        remaining = [len(futures)]
+
+        def group_done(_future: Future) -> None:
+            with self._lock:
+                remaining[0] -= 1
+                done = remaining[0] == 0
+
+            if done:
+                self._finish_update(device_id)
+
+        for future in futures:
+            future.add_done_callback(group_done)
+
+    async def _run_update_async(
+        self,
+        device_id: int,
+        endpoints: list[str],
+    ) -> None:
+        """
+        update a device, then release its reservation
+        """
+        try:
+            await self._update_device_async(device_id, endpoints)
+
+        finally:
+            self._finish_update(device_id)
+
+    def _finish_update(self, device_id: int) -> None:
+        """
+        release a devices reservation and start coalesced polls that
+        were waiting for it or for room in the queue
+        """
+        to_start = []
+
+        with self._lock:
+            self._n_in_flight -= 1
+
+            device = self._clients.get(device_id)
+            if device is not None:
+                device["in_flight"] = False
+                device["last_update"] = time.time()
+
+                # coalesced poll of this device goes first, duplicates
+                # in the backlog are skipped since `pending` gets reset
+                if device["pending"]:
+                    self._backlog.appendleft(device_id)
+
+            # nothing is started while stopping (`_launch_update` would
+            # finish it right away, recursing once per backlog entry)
+            while (
+                self.__running
+                and self._backlog
+                and self._n_in_flight < self._max_pending
+            ):
+                did = self._backlog.popleft()
+                pending = self._clients.get(did)
+
+                # removed or already polled
+                if pending is None or not pending["pending"]:
+                    continue
+
+                # endpoints already requested by the finished update
+                if not pending["queued"]:
+                    pending["pending"] = False
+                    continue
+
+                # will be re-queued once the running update finishes
+                if pending["in_flight"]:
+                    continue
+
+                self._try_reserve(did, pending)
+                to_start.append(did)
+
+        for did in to_start:
+            self._launch_update(did)
+
+    def _time_until_next_deadline(self) -> float | None:
+        """
+        :returns: seconds until the next device or snapshot is due, None
+            if there's nothing to wait for
+        """
+        deadline = self._scheduler.next_deadline()
+
+        if self._snapshot_path is not None:
+            if deadline is None or self._next_snapshot < deadline:
+                deadline = self._next_snapshot
+
+        if deadline is None:
+            return None
+
+        return max(deadline - time.monotonic(), 0)
+
+    def _wake(self) -> None:
+        """
+        wake up the requester loop, e.g. if the schedule changed
+        """
+        self._wakeup.set()
+
+        if self._loop is not None and self._async_wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_wakeup.set)
+
+            except RuntimeError:
+                # loop already closed
+                pass
+
+    def _update_device(
+        self,
+        device_id: int,
+        background: bool = True,
+        endpoints: list[str] | None = None,
+    ) -> None | list[Future]:
         """
         update a devices data
 
         :param device_id: device to update
-        :param background: starts thread if true
+        :param background: starts up to `max_parallel` threads if true
+        :param endpoints: endpoints to update, all if None
+        :returns: futures of the started threads (background only)
         """
+        device = self._clients[device_id]
+        debugger.trace(
+            "dev_buf: updating device %s at %s",
+            device_id,
+            device["device"].address,
+        )
+
+        if endpoints is None:
+            endpoints = self._get_endpoints(device)
+
+        endpoints, n_parallel = self._parallel_requests(device, endpoints)
+
+        # every thread takes the next endpoint once it's done, so a slow
+        # endpoint doesn't hold up the ones after it
+        pending = deque(endpoints)
+
         if background:
-            return self._pool.submit(self._update_device, device_id, False)
+            return [
+                self._pool.submit(self._update_endpoints, device_id, pending)
+                for _ in range(n_parallel)
+            ]
+
+        self._update_endpoints(device_id, pending)
+        return None
+
+    # timed here, `_update_device` only submits this to the pool
+    @profiler.span()
+    def _update_endpoints(self, device_id: int, endpoints: deque[str]) -> None:
+        """
+        request endpoints until there are none left, may run on multiple
+        threads at once
+
+        :param device_id: device to update
+        :param endpoints: endpoints to request, shared by the threads
+        """
+        while True:
+            try:
+                endpoint = endpoints.popleft()
+
+            except IndexError:
+                return
+
+            self._fetch_endpoint(device_id, endpoint)
+
+    @profiler.span()
+    def _fetch_endpoint(self, device_id: int, endpoint: str) -> bool:
+        """
+        request a single endpoint and save it to the buffer
+
+        :param device_id: device to request
+        :param endpoint: endpoint to request
+        :returns: success
+        """
+        device = self._clients.get(device_id)
+        if device is None:
+            return False
 
-        # request data from given address
+        # circuit opened during this update
+        if not device["health"].allow_request(time.monotonic()):
+            return False
+
+        address = device["device"].address
+        stats = device["stats"][endpoint]
+        debugger.trace(
+            "dev_buf: requesting http://%s:%s/%s",
+            address[0],
+            address[1],
+            endpoint,
+        )
+
+        start = time.perf_counter()
+        try:
+            data = requests.get(
+                f"http://{address[0]}:{address[1]}/{endpoint}",
+                timeout=self._request_timeout(device),
+            ).json()
+
+        except (
+            TimeoutError,
+            requests.ReadTimeout,
+            requests.ConnectTimeout,
+        ):
+            debugger.log(
+                "dev_buf: timeout getting data form %s",
+                address,
+                device_id=device_id,
+                endpoint=endpoint,
+                error="timeout",
+            )
+            stats.timeout += 1
+            self._record_result(device_id, device, False)
+            return False
+
+        except ValueError:
+            # device is reachable, but didn't send json
+            debugger.log(
+                'dev_buf: invalid data from %s at "%s"',
+                address,
+                endpoint,
+                device_id=device_id,
+                endpoint=endpoint,
+                error="invalid_data",
+            )
+            stats.invalid_data += 1
+            return False
+
+        # connection errors and broken responses (e.g. truncated bodies),
+        # after ValueError since invalid json is a RequestException too
+        except requests.RequestException:
+            debugger.log(
+                "dev_buf: failed to get data form %s",
+                address,
+                device_id=device_id,
+                endpoint=endpoint,
+                error="connection",
+            )
+            stats.connection_error += 1
+            self._record_result(device_id, device, False)
+            return False
+
+        duration = time.perf_counter() - start
+        stats.latency.observe(duration)
+        stats.success += 1
+
+        self._record_result(device_id, device, True)
+        self._store_data(device_id, endpoint, data, duration=duration)
+        return True
+
+    @profiler.span()
+    async def _update_device_async(
+        self,
+        device_id: int,
+        endpoints: list[str] | None = None,
+    ) -> None:
+        """
+        update a devices data using the pooled async connections
+
+        :param device_id: device to update
+        :param endpoints: endpoints to update, all if None
+        """
         device = self._clients[device_id]
-        dev: IOTDevice = device["device"]
         debugger.trace(
-            f"dev_buf: updating device {device_id} at {device['device'].address}"
+            "dev_buf: updating device %s at %s (async)",
+            device_id,
+            device["device"].address,
         )
 
-        for endpoint, endpoint_type in dev.endpoints:
-            # only request GET endpoints
-            if endpoint_type != EndpointType.GET:
-                continue
-            
-            debugger.trace(
-                f"dev_buf: requesting http://{device['device'].address[0]}:"
-                f"{device['device'].address[1]}/{endpoint}"
+        if endpoints is None:
+            endpoints = self._get_endpoints(device)
+
+        endpoints, n_parallel = self._parallel_requests(device, endpoints)
+
+        # started in order, a slow endpoint only blocks its own slot
+        semaphore = asyncio.Semaphore(n_parallel)
+
+        async def fetch(endpoint: str) -> None:
+            async with semaphore:
+                await self._fetch_endpoint_async(device_id, endpoint)
+
+        await asyncio.gather(*(fetch(endpoint) for endpoint in endpoints))
+
+    @profiler.span()
+    async def _fetch_endpoint_async(self, device_id: int, endpoint: str) -> bool:
+        """
+        request a single endpoint and save it to the buffer
+
+        :param device_id: device to request
+        :param endpoint: endpoint to request
+        :returns: success
+        """
+        device = self._clients.get(device_id)
+        if device is None:
+            return False
+
+        # circuit opened during this update
+        if not device["health"].allow_request(time.monotonic()):
+            return False
+
+        address = device["device"].address
+        stats = device["stats"][endpoint]
+
+        start = time.perf_counter()
+        try:
+            data = await self._poller.get_json(
+                address,
+                endpoint,
+                self._request_timeout(device),
             )
-            # request single endpoint and save to buffer
-            try:
-                data = requests.get(
-                    f"http://{device['device'].address[0]}:"
-                    f"{device['device'].address[1]}/{endpoint}",
-                    timeout=min(device["interval"] / 2, 5),
-                ).json()
-
-            except (
-                TimeoutError,
-                requests.ReadTimeout,
-                requests.ConnectTimeout,
-                requests.ConnectionError,
-            ):
-                debugger.log(
-                    f"dev_buf: failed to get data form {device['device'].address}"
+
+        except (
+            TimeoutError,
+            aiohttp.ServerTimeoutError,
+        ):
+            debugger.log(
+                "dev_buf: timeout getting data form %s",
+                address,
+                device_id=device_id,
+                endpoint=endpoint,
+                error="timeout",
+            )
+            stats.timeout += 1
+            self._record_result(device_id, device, False)
+            return False
+
+        # connection errors and broken responses (e.g. truncated bodies)
+        except aiohttp.ClientError:
+            debugger.log(
+                "dev_buf: failed to get data form %s",
+                address,
+                device_id=device_id,
+                endpoint=endpoint,
+                error="connection",
+            )
+            stats.connection_error += 1
+            self._record_result(device_id, device, False)
+            return False
+
+        except ValueError:
+            # device is reachable, but didn't send json
+            debugger.log(
+                'dev_buf: invalid data from %s at "%s"',
+                address,
+                endpoint,
+                device_id=device_id,
+                endpoint=endpoint,
+                error="invalid_data",
+            )
+            stats.invalid_data += 1
+            return False
+
+        duration = time.perf_counter() - start
+        stats.latency.observe(duration)
+        stats.success += 1
+
+        self._record_result(device_id, device, True)
+        self._store_data(device_id, endpoint, data, duration=duration)
+        return True
+
+    def _record_result(
+        self,
+        device_id: int,
+        device: _DeviceParams,
+        success: bool,
+    ) -> None:
+        """
+        update a devices health after a request
+
+        :param device_id: requested device
+        :param device: requested device params
+        :param success: if the request succeeded
+        """
+        breaker = device["health"]
+
+        if success:
+            if breaker.record_success() == DeviceHealth.OPEN:
+                debugger.info(
+                    "dev_buf: device %s is reachable again",
+                    device_id,
+                    device_id=device_id,
+                    health=breaker.state.name.lower(),
                 )
-                continue
 
-            device["last_data"][endpoint] = data
+                # probe succeeded, do a full update as soon as possible.
+                # the endpoints skipped while probing were rescheduled
+                # anyway, so they have to be made due again
+                now = time.monotonic()
+                with self._lock:
+                    for endpoint in device["next_due"]:
+                        device["next_due"][endpoint] = now
 
-            debugger.trace(
-                f'dev_buf: updated device {device_id} at "{endpoint}": {data}'
+                self._scheduler.schedule(device_id, now)
+                self._wake()
+
+            return
+
+        previous = breaker.state
+        if breaker.record_failure(time.monotonic()) != previous:
+            debugger.log(
+                "dev_buf: device %s is now %s",
+                device_id,
+                breaker.state.name.lower(),
+                device_id=device_id,
+                health=breaker.state.name.lower(),
             )
 
-        return None
+    @staticmethod
+    def _get_endpoints(device: _DeviceParams) -> list[str]:
+        """
+        all endpoints of a device that should be polled
+        """
+        return [
+            endpoint for endpoint, endpoint_type in device["device"].endpoints
+            if endpoint_type == EndpointType.GET
+        ]
+
+    @staticmethod
+    def _parallel_requests(
+        device: _DeviceParams,
+        endpoints: list[str],
+    ) -> tuple[list[str], int]:
+        """
+        which of a devices endpoints to request and how many at once
+
+        :returns: endpoints and the number of parallel requests (at most
+            `max_parallel`, at least 1)
+        """
+        # unreachable device, only probe a single endpoint
+        if device["health"].state == DeviceHealth.OPEN:
+            return endpoints[:1], 1
 
-    def add_device(self, device: IOTDevice, interval_s: float) -> int:
+        return endpoints, max(min(device["max_parallel"], len(endpoints)), 1)
+
+    @classmethod
+    def _request_timeout(cls, device: _DeviceParams) -> float:
+        """
+        timeout for a single endpoint request, probes of unreachable
+        devices get a shorter one
+        """
+        timeout = min(device["interval"] / 2, 5)
+
+        if device["health"].state == DeviceHealth.OPEN:
+            return min(timeout, cls._probe_timeout)
+
+        return timeout
+
+    @profiler.span()
+    def _store_data(
+        self,
+        device_id: int,
+        endpoint: str,
+        data: dict,
+        encoded: bytes | None = None,
+        received_at: float | None = None,
+        duration: float | None = None,
+    ) -> None:
+        """
+        save freshly requested data to the buffer
+
+        :param device_id: device the data belongs to
+        :param endpoint: endpoint the data was requested from
+        :param data: decoded response
+        :param encoded: `data` json encoded, if already done elsewhere
+        :param received_at: when the data was received, defaults to now
+        :param duration: seconds the request took
+        """
+        device = self._clients.get(device_id)
+
+        # device may have been removed while requesting
+        if device is None or endpoint not in device["data"]:
+            return
+
+        now = time.time() if received_at is None else received_at
+        previous = device["data"][endpoint]
+
+        # encode once here instead of on every read
+        if encoded is None:
+            encoded = json.dumps(data, separators=(",", ":")).encode()
+
+        # how long the previous data was kept past its interval, restored
+        # data doesn't count, its age includes the downtime
+        stats = device["stats"].get(endpoint)
+        if (
+            stats is not None
+            and previous.updated_at is not None
+            and not previous.stale
+        ):
+            interval = self.get_poll_interval(device_id, endpoint)
+            stats.lateness.observe(max(now - previous.updated_at - interval, 0))
+
+        # the etag and sequence number only change if the data did
+        changed = encoded != previous.encoded
+        digest = None
+        if changed:
+            digest = hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+        interval = self.get_poll_interval(device_id, endpoint)
+
+        with self._lock:
+            if not changed:
+                entry = EndpointData(
+                    data, encoded, previous.etag, now, previous.seq,
+                    duration=duration,
+                )
+
+            else:
+                self._seq += 1
+                entry = EndpointData(
+                    data, encoded, f'"{digest}"', now, self._seq,
+                    duration=duration,
+                )
+
+                # move to the end to keep the order
+                self._changes.pop((device_id, endpoint), None)
+                self._changes[(device_id, endpoint)] = self._seq
+                self._removed.discard((device_id, endpoint))
+
+            device["data"][endpoint] = entry
+
+            # under the lock, the store's sequence number must only move
+            # on once every older change is written
+            if self._shared_store is not None:
+                self._shared_store.put(device_id, endpoint, entry, interval)
+
+        history = device["history"].get(endpoint)
+        if history is not None:
+            history.append(now, data)
+
+        # encoded once for all subscribers
+        if changed and self._subscriptions:
+            head = json.dumps(
+                {"device_id": device_id, "endpoint": endpoint, "time": now},
+                separators=(",", ":"),
+            ).encode()
+            self._subscriptions.publish(
+                device_id,
+                endpoint,
+                head[:-1] + b',"data":' + encoded + b"}",
+            )
+
+        # the payload is only formatted if tracing is enabled
+        debugger.trace(
+            'dev_buf: updated device %s at "%s": %s',
+            device_id,
+            endpoint,
+            data,
+            device_id=device_id,
+            endpoint=endpoint,
+            latency=duration,
+        )
+
+    def add_device(
+        self,
+        device: IOTDevice,
+        interval_s: float,
+        max_parallel: int = 1,
+        adaptive_range: tuple[float, float] | None = None,
+        history_size: int = 0,
+        history_fields: int = 8,
+    ) -> int:
         """
         add an IOT device to the request list
 
         :param device: IOT device to add
         :param interval_s: interval in seconds between device requests
+        :param max_parallel: max. endpoints of this device requested at
+            the same time, 1 requests them one after another
+        :param adaptive_range: (floor, ceiling) in seconds, if given each
+            endpoint is polled depending on how often it's read instead
+            of every `interval_s`
+        :param history_size: number of samples kept per endpoint for
+            `get_device_history`, 0 disables the history
+        :param history_fields: max. numeric fields kept per sample, each
+            sample takes (1 + history_fields) * 8 bytes
         :returns: client id
         """
         cid = device.id
 
         debugger.log(f"dev_buf: adding device {cid} at {device.address}")
 
-        self._clients[cid] = {
+        now = time.monotonic()
+        first_poll = now + self._first_poll_offset(cid, interval_s)
+        endpoints = [
+            ep for ep, ep_type in device.endpoints if ep_type == EndpointType.GET
+        ]
+
+        rates = None
+        if adaptive_range is not None:
+            rates = {ep: AdaptiveRate(*adaptive_range) for ep in endpoints}
+
+        # restored entries get sequence numbers, the store has to get them
+        # in order (see `_store_data`)
+        with self._lock:
+            data = {
+                ep: self._restore_entry(cid, ep) for ep, _ in device.endpoints
+            }
+
+            if self._shared_store is not None:
+                for endpoint, entry in data.items():
+                    self._shared_store.put(
+                        cid,
+                        endpoint,
+                        entry,
+                        interval_s,
+                        polled=endpoint in endpoints,
+                    )
+
+        params: _DeviceParams = {
             "device": device,
             "interval": interval_s,
+            "max_parallel": max_parallel,
             "last_update": 0,
-            "last_data": {ep[0]: ... for ep in device.endpoints},
+            "data": data,
+            "next_due": {ep: first_poll for ep in endpoints},
+            "polled_at": {},
+            "queued": set(),
+            "rates": rates,
+            "history": {
+                ep: EndpointHistory(history_size, history_fields)
+                for ep in endpoints
+            } if history_size > 0 else {},
+            "in_flight": False,
+            "pending": False,
+            "skipped": 0,
+            "health": CircuitBreaker(),
+            "commands": CommandQueue(),
+            "stats": {ep: EndpointStats() for ep in endpoints},
         }
 
+        # publish a new registry, readers keep using the old one
+        with self._registry_lock:
+            self._clients = self._clients.set(cid, params)
+
+        self._start_polling(cid, params, first_poll)
         return cid
 
+    def _start_polling(
+        self,
+        device_id: int,
+        device: _DeviceParams,
+        first_poll: float,
+    ) -> None:
+        """
+        schedule a newly added device
+
+        :param device_id: added device
+        :param device: added device params
+        :param first_poll: monotonic time of the first poll
+        """
+        # first poll is due immediately, unless polls are spread
+        self._scheduler.schedule(device_id, first_poll)
+        self._wake()
+
+    def _stop_polling(self, device_id: int) -> None:
+        """
+        unschedule a removed device
+        """
+        self._scheduler.remove(device_id)
+        self._wake()
+
     def remove_device(self, device_id: int) -> bool:
         """
         remove an IOT device from the request list
@@ -154,20 +1125,715 @@ class DeviceBuffer:
         :return: success
         """
         debugger.log(f"dev_buf: removing device {device_id}")
-        if device_id in self._clients:
-            self._clients.pop(device_id)
-            return True
 
-        return False
+        with self._registry_lock:
+            if device_id not in self._clients:
+                return False
+
+            device = self._clients[device_id]
+            self._clients = self._clients.delete(device_id)
+
+        self._stop_polling(device_id)
+
+        # reported by `get_changes`, so clients drop the endpoints too
+        with self._lock:
+            for endpoint in device["data"]:
+                key = (device_id, endpoint)
+                self._seq += 1
+                self._changes.pop(key, None)
+                self._changes[key] = self._seq
+                self._removed.add(key)
+
+            if self._shared_store is not None:
+                self._shared_store.remove(device_id, self._seq)
+
+        # queued commands won't be sent anymore
+        for command in device["commands"].clear():
+            if not command.result.done():
+                command.result.get_loop().call_soon_threadsafe(
+                    command.result.set_result,
+                    None,
+                )
 
-    def get_device_data(self, device_id: int, endpoint: str) -> dict | int:
+        return True
+
+    def get_device_data(
+        self,
+        device_id: int,
+        endpoint: str,
+        encoded: bool = False,
+    ) -> dict | bytes | int | EllipsisType:
         """
         return the data of the given device and endpoint
+
+        :param device_id: device to read
+        :param endpoint: endpoint to read
+        :param encoded: return the json encoded bytes instead
+        :returns: -1 for invalid endpoints, ... if there's no data yet
+        """
+        entry = self.get_endpoint_data(device_id, endpoint)
+
+        if entry == -1:
+            return -1
+
+        if encoded:
+            return ... if entry.encoded is None else entry.encoded
+
+        return entry.data
+
+    def get_endpoint_data(self, device_id: int, endpoint: str) -> EndpointData | int:
+        """
+        return the data of the given device and endpoint together with
+        its metadata, consistent with each other
+
+        :param device_id: device to read
+        :param endpoint: endpoint to read
+        :returns: -1 for invalid endpoints
+        """
+        device = self._clients[device_id]
+        entry = device["data"].get(endpoint)
+
+        if entry is None:
+            return -1
+
+        if device["rates"] is not None and endpoint in device["rates"]:
+            self._record_read(device_id, device, endpoint)
+
+        return entry
+
+    def get_batch_data(
+        self,
+        requested: tp.Iterable[tuple[int | None, str | None]],
+    ) -> list[tuple[BatchItem, bytes | None]]:
+        """
+        read multiple endpoints at once
+
+        :param requested: (device id, endpoint) pairs, None for either
+            one selects all devices / all GET endpoints
+        :returns: per resolved endpoint its status and json encoded data
+        """
+        out = []
+
+        for device_id, endpoint in requested:
+            if device_id is None:
+                device_ids = list(self._clients)
+
+            else:
+                device_ids = [device_id]
+
+            for did in device_ids:
+                device = self._clients.get(did)
+
+                if device is None:
+                    out.append(({
+                        "device_id": did,
+                        "endpoint": endpoint,
+                        "status": "not_found",
+                        "age": None,
+                        "etag": None,
+                        "stale": False,
+                        "fetched_at": None,
+                        "fetch_started": None,
+                        "fetch_duration": None,
+                    }, None))
+                    continue
+
+                if endpoint is None:
+                    endpoints = list(device["next_due"])
+
+                else:
+                    endpoints = [endpoint]
+
+                for ep in endpoints:
+                    entry = self.get_endpoint_data(did, ep)
+
+                    if entry == -1:
+                        entry = EndpointData()
+                        status = "not_found"
+
+                    elif entry.encoded is None:
+                        status = "no_data"
+
+                    else:
+                        status = "ok"
+
+                    out.append(({
+                        "device_id": did,
+                        "endpoint": ep,
+                        "status": status,
+                        "age": self._age(entry),
+                        "etag": entry.etag,
+                        "stale": entry.stale,
+                        "fetched_at": entry.updated_at,
+                        "fetch_started": entry.started_at,
+                        "fetch_duration": entry.duration,
+                    }, entry.encoded))
+
+        return out
+
+    def get_changes(
+        self,
+        since: int,
+    ) -> tuple[int, list[tuple[dict, bytes | None]]]:
+        """
+        get all endpoints whose data changed after the given sequence
+        number, only walks the changed endpoints
+
+        :param since: sequence number of the last known change, everything
+            is returned if it's newer than the current one (e.g. from
+            before a restart, check `epoch`)
+        :returns: current sequence number, per changed endpoint its
+            device id, endpoint, sequence number and json encoded data.
+            removed endpoints have ``"removed": True`` and no data
         """
-        if endpoint not in self._clients[device_id]["last_data"]:
+        with self._lock:
+            seq = self._seq
+
+            if since > seq:
+                since = 0
+
+            changed = []
+            for key in reversed(self._changes):
+                if self._changes[key] <= since:
+                    break
+
+                changed.append((key, self._changes[key], key in self._removed))
+
+        out = []
+        for (device_id, endpoint), endpoint_seq, removed in reversed(changed):
+            device = self._clients.get(device_id)
+
+            if removed or device is None or endpoint not in device["data"]:
+                out.append(({
+                    "device_id": device_id,
+                    "endpoint": endpoint,
+                    "seq": endpoint_seq,
+                    "removed": True,
+                }, None))
+                continue
+
+            out.append(({
+                "device_id": device_id,
+                "endpoint": endpoint,
+                "seq": endpoint_seq,
+            }, device["data"][endpoint].encoded))
+
+        return seq, out
+
+    def get_device_history(
+        self,
+        device_id: int,
+        endpoint: str,
+        start: float | None = None,
+        end: float | None = None,
+        buckets: int = 60,
+    ) -> dict | int:
+        """
+        return the downsampled numeric history of the given endpoint,
+        see `EndpointHistory.query`
+
+        :returns: -1 if the endpoint doesn't keep a history
+        """
+        device = self._clients.get(device_id)
+        if device is None or endpoint not in device["history"]:
             return -1
 
-        return self._clients[device_id]["last_data"][endpoint]
+        return device["history"][endpoint].query(start, end, buckets)
+
+    def get_poll_interval(self, device_id: int, endpoint: str) -> float:
+        """
+        return the current poll interval of the given endpoint
+        """
+        device = self._clients[device_id]
+
+        if device["rates"] is None or endpoint not in device["rates"]:
+            return device["interval"]
+
+        return self._endpoint_interval(device, endpoint, time.monotonic())
+
+    def get_data_age(self, device_id: int, endpoint: str) -> float | None:
+        """
+        seconds since the given endpoint was last updated
+
+        :returns: None if the endpoint has no data yet
+        """
+        entry = self._clients[device_id]["data"].get(endpoint)
+        if entry is None:
+            return None
+
+        return self._age(entry)
+
+    @staticmethod
+    def _age(entry: EndpointData) -> float | None:
+        """
+        seconds since an endpoints data was received, None if never
+        """
+        if entry.updated_at is None:
+            return None
+
+        return max(time.time() - entry.updated_at, 0)
+
+    async def fetch_device_data(
+        self,
+        device_id: int,
+        endpoint: str,
+    ) -> EndpointData | int:
+        """
+        request a single endpoint right away, concurrent calls for the
+        same endpoint share one request
+
+        :param device_id: device to request
+        :param endpoint: endpoint to request
+        :returns: the data after the request, -1 for invalid endpoints
+        """
+        device = self._clients[device_id]
+
+        # only GET endpoints can be requested
+        if endpoint not in device["next_due"]:
+            return device["data"].get(endpoint, -1)
+
+        key = (device_id, endpoint)
+        fetch = self._fetches.get(key)
+
+        if fetch is None:
+            debugger.trace(
+                'dev_buf: on demand request of device %s, "%s"',
+                device_id,
+                endpoint,
+            )
+            fetch = asyncio.ensure_future(self._fetch_once(device_id, endpoint))
+            self._fetches[key] = fetch
+            fetch.add_done_callback(lambda _: self._fetches.pop(key, None))
+
+        # a cancelled reader mustn't cancel the request for the others
+        await asyncio.shield(fetch)
+
+        return device["data"][endpoint]
+
+    async def _fetch_once(self, device_id: int, endpoint: str) -> bool:
+        """
+        request a single endpoint using the selected engine
+        """
+        if self._engine == PollEngine.ASYNC:
+            return await self._fetch_endpoint_async(device_id, endpoint)
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool,
+            self._fetch_endpoint,
+            device_id,
+            endpoint,
+        )
+
+    def _record_read(
+        self,
+        device_id: int,
+        device: _DeviceParams,
+        endpoint: str,
+    ) -> None:
+        """
+        count a read of an adaptive endpoint and poll it earlier if it
+        got more popular
+
+        :param device_id: read device
+        :param device: read device params
+        :param endpoint: read endpoint
+        """
+        now = time.monotonic()
+        interval = device["rates"][endpoint].record_read(now)
+
+        polled_at = device["polled_at"].get(endpoint)
+        if polled_at is None:
+            return
+
+        due = max(polled_at + interval, now)
+        if due >= device["next_due"][endpoint]:
+            return
+
+        device["next_due"][endpoint] = due
+        if self._scheduler.advance(device_id, due):
+            self._wake()
+
+    async def send_command(
+        self,
+        device_id: int,
+        endpoint: str,
+        body: tp.Any,
+    ) -> tuple[int, bytes] | int | None:
+        """
+        queue a write to a POST or PUT endpoint. commands of a device are
+        sent one after another, a PUT queued right after a PUT to the same
+        endpoint replaces it.
+
+        :param device_id: device to write to
+        :param endpoint: POST or PUT endpoint
+        :param body: json serializable request body
+        :returns: response status and body, -1 for invalid devices or
+            endpoints, None if the device couldn't be reached
+        """
+        device = self._clients.get(device_id)
+        if device is None:
+            return -1
+
+        method = dict(device["device"].endpoints).get(endpoint)
+
+        if method is None or method == EndpointType.GET:
+            return -1
+
+        commands = device["commands"]
+        command = commands.put(endpoint, method, body)
+        self._command_loop = asyncio.get_running_loop()
+
+        if not commands.running:
+            commands.running = True
+            task = asyncio.ensure_future(self._send_commands(device_id, device))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # a cancelled caller mustn't cancel the command for the others
+        return await asyncio.shield(command.result)
+
+    async def _send_commands(self, device_id: int, device: _DeviceParams) -> None:
+        """
+        send the queued commands of a device until there are none left
+        """
+        commands = device["commands"]
+
+        try:
+            while (command := commands.pop()) is not None:
+                try:
+                    await self._send_command(device_id, device, command)
+
+                finally:
+                    # whatever happened, the callers mustn't wait forever
+                    if not command.result.done():
+                        command.result.set_result(None)
+
+        except BaseException:
+            # cancelled (e.g. shutdown), nobody is going to send the rest
+            for command in commands.clear():
+                if not command.result.done():
+                    command.result.set_result(None)
+
+            raise
+
+        finally:
+            commands.running = False
+
+    async def _send_command(
+        self,
+        device_id: int,
+        device: _DeviceParams,
+        command: Command,
+    ) -> None:
+        """
+        send a single command and set its result
+        """
+        address = device["device"].address
+
+        # unreachable device, don't wait for the timeout
+        if not device["health"].allow_request(time.monotonic()):
+            command.result.set_result(None)
+            return
+
+        if command.merged:
+            debugger.trace(
+                'dev_buf: merged %s commands to device %s "%s"',
+                command.merged,
+                device_id,
+                command.endpoint,
+            )
+
+        async with self._command_slots:
+            try:
+                result = await self._poller.send_json(
+                    command.method.name,
+                    address,
+                    command.endpoint,
+                    command.body,
+                    self._request_timeout(device),
+                )
+
+            except (TimeoutError, aiohttp.ClientError) as error:
+                debugger.log(
+                    "dev_buf: failed to send command to %s: %r",
+                    address,
+                    error,
+                    device_id=device_id,
+                    endpoint=command.endpoint,
+                    error="command",
+                )
+                self._record_result(device_id, device, False)
+                command.result.set_result(None)
+                return
+
+            except ValueError:
+                # e.g. a body that can't be encoded, not the devices fault
+                debugger.log(
+                    "dev_buf: invalid command to %s",
+                    address,
+                    device_id=device_id,
+                    endpoint=command.endpoint,
+                )
+                command.result.set_result(None)
+                return
+
+        self._record_result(device_id, device, True)
+        command.result.set_result(result)
+
+    def get_staleness(
+        self,
+        device_id: int | None = None,
+        target: float | None = None,
+    ) -> dict | int:
+        """
+        distribution of how far past their interval the endpoints data got
+        before it was replaced
+
+        :param device_id: only the endpoints of this device, all if None
+        :param target: max. acceptable lateness in seconds, adds the
+            estimated fraction of updates within it
+        :returns: summary of all selected endpoints and of each one, -1 if
+            the device isn't buffered
+        """
+        if device_id is None:
+            devices = list(self._clients.items())
+
+        elif device_id in self._clients:
+            devices = [(device_id, self._clients[device_id])]
+
+        else:
+            return -1
+
+        total = Histogram(LATENESS_BUCKETS)
+        endpoints = []
+
+        for did, device in devices:
+            for endpoint, stats in device["stats"].items():
+                stats = self._endpoint_stats(did, endpoint, stats)
+                total.merge(stats.lateness)
+                endpoints.append({
+                    "device_id": did,
+                    "endpoint": endpoint,
+                    "interval": self.get_poll_interval(did, endpoint),
+                    **stats.lateness.summary(target),
+                })
+
+        return {
+            "buckets": list(LATENESS_BUCKETS),
+            "all": total.summary(target),
+            "endpoints": endpoints,
+        }
+
+    def _poller_state(self) -> tuple[int, int, int, int]:
+        """
+        :returns: pool queue depth, updates in flight, backlog length and
+            number of skipped polls
+        """
+        return (
+            self._pool._work_queue.qsize(),
+            self._n_in_flight,
+            len(self._backlog),
+            self._skipped_polls,
+        )
+
+    def _endpoint_stats(
+        self,
+        device_id: int,
+        endpoint: str,
+        stats: EndpointStats,
+    ) -> EndpointStats:
+        """
+        statistics of an endpoint for the metrics, `stats` are the ones
+        recorded by this process
+        """
+        return stats
+
+    def write_metrics(self, writer: MetricsWriter) -> None:
+        """
+        add the pollers metrics to a metrics page
+        """
+        queue_depth, in_flight, backlog, skipped = self._poller_state()
+
+        writer.gauge(
+            "iot_poll_queue_depth",
+            queue_depth,
+            "tasks waiting for a free pool thread",
+        )
+        writer.gauge(
+            "iot_polls_in_flight",
+            in_flight,
+            "device updates queued or running",
+        )
+        writer.gauge(
+            "iot_poll_backlog",
+            backlog,
+            "device updates waiting for room in the queue",
+        )
+        writer.counter(
+            "iot_polls_skipped_total",
+            skipped,
+            "polls dropped or coalesced because of backpressure",
+        )
+
+        now = time.time()
+        for did, device in self._clients.items():
+            for endpoint, stats in device["stats"].items():
+                stats = self._endpoint_stats(did, endpoint, stats)
+                labels = {"device": did, "endpoint": endpoint}
+
+                writer.histogram(
+                    "iot_poll_latency_seconds",
+                    stats.latency,
+                    "duration of successful endpoint requests",
+                    **labels,
+                )
+                for result in (
+                    "success",
+                    "timeout",
+                    "connection_error",
+                    "invalid_data",
+                ):
+                    writer.counter(
+                        "iot_poll_requests_total",
+                        getattr(stats, result),
+                        "finished endpoint requests by result",
+                        result=result,
+                        **labels,
+                    )
+
+                writer.histogram(
+                    "iot_data_lateness_seconds",
+                    stats.lateness,
+                    "seconds past the interval data got before it was replaced",
+                    **labels,
+                )
+
+                updated_at = device["data"][endpoint].updated_at
+                if updated_at is not None:
+                    writer.gauge(
+                        "iot_data_age_seconds",
+                        max(now - updated_at, 0),
+                        "seconds since the buffered data was received",
+                        **labels,
+                    )
+
+    def subscribe(
+        self,
+        topics: tp.Iterable[Topic],
+        max_queue: int = 64,
+    ) -> Subscription:
+        """
+        get notified about changed data, must be called from the event
+        loop that reads the subscription
+
+        :param topics: (device id, endpoint) pairs, None matches all
+        :param max_queue: max. pending updates, the oldest ones are dropped
+        """
+        return self._subscriptions.subscribe(topics, max_queue)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        stop sending updates to a subscription
+        """
+        self._subscriptions.unsubscribe(subscription)
+
+    def get_device_health(self, device_id: int) -> dict | int:
+        """
+        return the health state of the given device
+
+        :returns: -1 if the device isn't buffered
+        """
+        device = self._clients.get(device_id)
+        if device is None:
+            return -1
+
+        return device["health"].to_dict()
+
+    def get_health(self) -> dict[int, dict]:
+        """
+        return the health state of all buffered devices
+        """
+        return {
+            did: device["health"].to_dict()
+            for did, device in self._clients.items()
+        }
+
+    def _load_snapshot(self, path: str) -> None:
+        """
+        read the data of the last snapshot, it's used once the devices
+        are added
+        """
+        if not os.path.exists(path):
+            return
+
+        try:
+            records = read_snapshot(path)
+
+        except (OSError, ValueError) as error:
+            debugger.warning(f"dev_buf: failed to load snapshot: {error}")
+            return
+
+        self._restored = {(r.device_id, r.endpoint): r for r in records}
+        debugger.log(f"dev_buf: loaded {len(records)} entries from snapshot")
+
+    def _restore_entry(self, device_id: int, endpoint: str) -> EndpointData:
+        """
+        initial data of an endpoint, either empty or from the snapshot
+        (with its original timestamp), `_lock` has to be held
+        """
+        record = self._restored.pop((device_id, endpoint), None)
+        if record is None:
+            return EndpointData()
+
+        try:
+            data = json.loads(record.encoded)
+
+        except ValueError:
+            return EndpointData()
+
+        digest = hashlib.blake2b(record.encoded, digest_size=8).hexdigest()
+
+        self._seq += 1
+        self._changes.pop((device_id, endpoint), None)
+        self._changes[(device_id, endpoint)] = self._seq
+        self._removed.discard((device_id, endpoint))
+
+        return EndpointData(
+            data,
+            record.encoded,
+            f'"{digest}"',
+            record.updated_at,
+            self._seq,
+            stale=True,
+        )
+
+    def save_snapshot(self) -> bool:
+        """
+        write all buffered data to the snapshot file
+
+        :returns: success
+        """
+        if self._snapshot_path is None:
+            return False
+
+        records = [
+            SnapshotRecord(did, endpoint, entry.updated_at, entry.encoded)
+            for did, device in self._clients.items()
+            for endpoint, entry in device["data"].items()
+            if entry.encoded is not None
+        ]
+
+        # periodic and shutdown snapshots may overlap
+        with self._snapshot_lock:
+            try:
+                n = write_snapshot(self._snapshot_path, records)
+
+            except OSError as error:
+                debugger.warning(f"dev_buf: failed to save snapshot: {error}")
+                return False
+
+        debugger.trace(f"dev_buf: saved {n} entries to snapshot")
+        return True
 
     def shutdown(self) -> None:
         debugger.trace("dev_buf: shutdown called")
@@ -178,12 +1844,41 @@ class DeviceBuffer:
 
         # shutdown threads
         self.__running = False
+        self._wake()
 
         debugger.trace("dev_buf: waiting for threads ...")
         self._pool.shutdown(wait=True)
 
+        # the async engine closes its connections itself
+        if self._engine != PollEngine.ASYNC and self._command_loop is not None:
+            self._close_command_session()
+
+        self.save_snapshot()
+
         debugger.log("dev_buf: shutdown")
 
+    def _close_command_session(self) -> None:
+        """
+        close the connections of commands sent by the threaded engine,
+        on their loop if it's still open
+        """
+        if self._command_loop.is_closed():
+            self._poller.close_sync()
+            return
+
+        close = self._poller.close()
+        try:
+            asyncio.run_coroutine_threadsafe(close, self._command_loop)
+
+        except RuntimeError:
+            # closed in the meantime
+            close.close()
+            self._poller.close_sync()
+
     def __del__(self):
+        # __init__ raised before anything was started
+        if not hasattr(self, "_DeviceBuffer__running"):
+            return
+
         debugger.trace("dev_buf: __del__ called")
         self.shutdown()
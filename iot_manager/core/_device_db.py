@@ -44,6 +44,7 @@ class DeviceDB:
 
     :cvar _default_path: default database path.
 
+    :ivar path: database file.
     :ivar _conn: sqlite3 connection.
     """
 
@@ -52,6 +53,7 @@ class DeviceDB:
     # endregion
 
     # region InstanceVars
+    path: PathLike | str
     _conn: sqlite3.Connection
     # endregion
 
@@ -62,6 +64,7 @@ class DeviceDB:
         else:
             path_ = path
 
+        self.path = path_
         self._conn = sqlite3.connect(path_)
 
     def __check_create(self) -> None:
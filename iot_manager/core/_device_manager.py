@@ -11,6 +11,8 @@ import ipaddress
 import typing as tp
 from copy import copy
 from ipaddress import IPv4Address
+from os import PathLike
+from types import EllipsisType
 
 from ._datatypes import IOTDevice
 from ._device_db import DeviceDB
@@ -27,8 +29,15 @@ class DeviceManager:
     _db: DeviceDB
     # endregion
 
-    def __init__(self):
-        self._db = DeviceDB()
+    def __init__(self, db_path: PathLike | EllipsisType = ...):
+        """
+        :param db_path: device database, `DeviceDB`'s default if not given
+        """
+        self._db = DeviceDB(db_path)
+
+    @property
+    def db_path(self) -> PathLike | str:
+        return self._db.path
 
     def get_device(self, device_id: int) -> IOTDevice:
         """
@@ -0,0 +1,222 @@
+"""
+Fixed size numeric history of an endpoint.
+
+| ``Path``: iot_manager/core/_history.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import math
+import threading
+import typing as tp
+
+import numpy as np
+
+
+def _numeric_fields(data: tp.Any, prefix: str = "") -> tp.Iterator[tuple[str, float]]:
+    """
+    Find all numeric values in a (nested) json payload.
+
+    :param data: decoded json data.
+    :param prefix: key of the parent object.
+    :return: (dotted key, value) pairs.
+    """
+    if not isinstance(data, dict):
+        return
+
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+
+        # bool is a subclass of int
+        if isinstance(value, bool):
+            continue
+
+        if isinstance(value, (int, float)):
+            yield name, float(value)
+
+        elif isinstance(value, dict):
+            yield from _numeric_fields(value, f"{name}.")
+
+
+def _to_list(values: np.ndarray) -> list[float | None]:
+    """Convert to a json compatible list (NaN becomes None)."""
+    return [None if math.isnan(v) else v for v in values.tolist()]
+
+
+class EndpointHistory:
+    """
+    Ring buffer of the numeric fields of an endpoints payloads.
+
+    All memory is allocated up front: ``capacity`` samples of up to
+    ``max_fields`` numeric fields each. Fields get a column the first time
+    they show up, fields beyond ``max_fields`` are ignored. Missing values
+    are stored as NaN.
+
+    :ivar capacity: max. number of stored samples.
+    :ivar max_fields: max. number of stored fields.
+    :ivar _timestamps: sample times (unix seconds).
+    :ivar _values: sample values, one column per field.
+    :ivar _fields: field name -> column.
+    :ivar _head: index the next sample is written to.
+    :ivar _size: number of stored samples.
+    :ivar _lock: samples are written by the pollers and read by the server.
+    """
+
+    # region InstanceVars
+    capacity: int
+    max_fields: int
+    _timestamps: np.ndarray
+    _values: np.ndarray
+    _fields: dict[str, int]
+    _head: int
+    _size: int
+    _lock: threading.Lock
+    # endregion
+
+    def __init__(self, capacity: int, max_fields: int = 8) -> None:
+        self.capacity = capacity
+        self.max_fields = max_fields
+
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._values = np.full((capacity, max_fields), np.nan, dtype=np.float64)
+        self._fields = {}
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the sample arrays."""
+        return self._timestamps.nbytes + self._values.nbytes
+
+    def append(self, timestamp: float, data: tp.Any) -> None:
+        """
+        Store the numeric fields of a payload.
+
+        :param timestamp: time the payload was received at (unix seconds).
+        :param data: decoded json payload.
+        """
+        with self._lock:
+            row = self._values[self._head]
+            row.fill(np.nan)
+
+            for name, value in _numeric_fields(data):
+                column = self._fields.get(name)
+
+                if column is None:
+                    # no room for new fields
+                    if len(self._fields) >= self.max_fields:
+                        continue
+
+                    column = len(self._fields)
+                    self._fields[name] = column
+
+                row[column] = value
+
+            self._timestamps[self._head] = timestamp
+            self._head = (self._head + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def _window(self, start: float, end: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Copy the samples within [start, end] (lock must be held).
+
+        The ring holds at most two time-sorted segments, only the matching
+        parts of them are copied.
+
+        :return: timestamps, values.
+        """
+        if self._size < self.capacity:
+            segments = [slice(0, self._size)]
+
+        else:
+            segments = [slice(self._head, self.capacity), slice(0, self._head)]
+
+        timestamps = []
+        values = []
+        for segment in segments:
+            ts = self._timestamps[segment]
+            first = np.searchsorted(ts, start, side="left")
+            last = np.searchsorted(ts, end, side="right")
+
+            timestamps.append(ts[first:last])
+            values.append(self._values[segment][first:last])
+
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def query(
+        self,
+        start: float | None = None,
+        end: float | None = None,
+        buckets: int = 60,
+    ) -> dict:
+        """
+        Downsample the samples of a time window.
+
+        :param start: window start (unix seconds), oldest sample if None.
+        :param end: window end (unix seconds), newest sample if None.
+        :param buckets: number of equally long buckets, empty ones are
+            left out. At most one per sample in the window.
+        :return: per bucket start, end, sample count and min / max / mean
+            of every field.
+        """
+        with self._lock:
+            if start is None:
+                start = -math.inf
+
+            if end is None:
+                end = math.inf
+
+            timestamps, values = self._window(start, end)
+            fields = list(self._fields)
+
+        out = {
+            "capacity": self.capacity,
+            "size": self._size,
+            "start": [],
+            "end": [],
+            "count": [],
+            "fields": {
+                name: {"min": [], "max": [], "mean": []} for name in fields
+            },
+        }
+
+        if not len(timestamps) or buckets < 1:
+            return out
+
+        # the edges are allocated even for empty buckets
+        buckets = min(buckets, len(timestamps))
+
+        # buckets span the samples in the window, the last one includes
+        # its end
+        edges = np.linspace(timestamps[0], timestamps[-1], buckets + 1)
+        bounds = np.searchsorted(timestamps, edges[1:-1], side="left")
+        bounds = np.concatenate(([0], bounds, [len(timestamps)]))
+
+        # drop empty buckets
+        filled = bounds[:-1] < bounds[1:]
+        starts = bounds[:-1][filled]
+        counts = (bounds[1:] - bounds[:-1])[filled]
+
+        out["start"] = edges[:-1][filled].tolist()
+        out["end"] = edges[1:][filled].tolist()
+        out["count"] = counts.tolist()
+
+        for name in fields:
+            column = values[:, self._fields[name]]
+            valid = ~np.isnan(column)
+
+            n_valid = np.add.reduceat(valid.astype(np.int64), starts)
+            sums = np.add.reduceat(np.where(valid, column, 0), starts)
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = np.where(n_valid > 0, sums / n_valid, np.nan)
+
+            out["fields"][name] = {
+                "min": _to_list(np.fmin.reduceat(column, starts)),
+                "max": _to_list(np.fmax.reduceat(column, starts)),
+                "mean": _to_list(means),
+            }
+
+        return out
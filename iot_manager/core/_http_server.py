@@ -8,30 +8,185 @@ Author:
 Nilusink
 """
 
+import asyncio
+import json
+import multiprocessing as mp
+import time
+import typing as tp
 from copy import copy
 from http import HTTPStatus
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from icecream import ic
+from pydantic import BaseModel
 
-from ..utils.debugging import debugger
+from ..utils.debugging import debugger, profiler
 from ._device_buffer import DeviceBuffer
 from ._device_manager import DeviceManager
+from ._metrics import Histogram, MetricsWriter
+from ._shared_store import SharedStore, SharedStoreView
+
+# more would only allocate empty buckets (see `EndpointHistory.query`)
+_MAX_HISTORY_BUCKETS = 1000
+
+# pending updates of a single subscriber, clients that don't read
+# shouldn't be able to grow the servers memory
+_MAX_STREAM_QUEUE = 1024
+
+
+class _BatchRequest(BaseModel):
+    """single entry of a batch read, None selects all"""
+
+    device_id: int | None = None
+    endpoint: str | None = None
+
+
+def _parse_topic(topic: str) -> tuple[int | None, str | None]:
+    """
+    parse a subscription topic: "*", "<device id>" or "<device id>/<endpoint>"
+
+    :raises ValueError: if the device id isn't a number
+    """
+    device_id, _, endpoint = topic.strip().partition("/")
+    endpoint = endpoint.strip().rstrip("/")
+
+    if device_id in ("", "*"):
+        return None, endpoint or None
+
+    return int(device_id), endpoint or None
+
+
+def _splice_items(items: list[tuple[dict, bytes | None]]) -> bytes:
+    """
+    encode items as a json list, adding the already encoded data to each
+    """
+    parts = []
+    for item, data in items:
+        head = json.dumps(item, separators=(",", ":")).encode()
+        parts.append(head[:-1] + b',"data":' + (data or b"null") + b"}")
+
+    return b"[" + b",".join(parts) + b"]"
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    check an If-None-Match header against an entity tag (weak comparison)
+    """
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+
+    return False
+
+
+class _RouteTimer:
+    """
+    ASGI middleware recording the time until the response starts, per
+    method and route
+    """
+
+    def __init__(
+        self,
+        app,
+        histograms: dict[tuple[str, str], Histogram],
+    ) -> None:
+        self._app = app
+        self._histograms = histograms
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self._app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def timed_send(message) -> None:
+            if message["type"] == "http.response.start":
+                # set by the router, route templates keep the labels bounded
+                route = scope.get("route")
+                key = (
+                    scope["method"],
+                    "unmatched" if route is None else route.path,
+                )
+
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram()
+
+                histogram.observe(time.perf_counter() - start)
+
+            await send(message)
+
+        await self._app(scope, receive, timed_send)
+
+
+def _run_worker(
+    index: int,
+    sock,
+    store_path: str,
+    db_path: str,
+    address: tuple[str, int],
+    debug_settings: dict,
+) -> None:
+    """
+    entry point of a server worker process, serves the shared store on
+    the socket of the parent
+
+    :param index: worker number
+    :param sock: bound listening socket
+    :param store_path: `SharedStore` file written by the polling process
+    :param db_path: device database of the parent
+    :param address: (host, port), only used for logging
+    :param debug_settings: see `debugger.child_settings`
+    """
+    ic.configureOutput(prefix=lambda: f"worker {index: <3} |> ")
+    debugger.init(**debug_settings)
+
+    server = HTTPServer(
+        SharedStoreView(SharedStore.open(store_path)),
+        DeviceManager(db_path),
+        address,
+    )
+    uvicorn.Server(server._config()).run(sockets=[sock])
 
 
 class HTTPServer:
     def __init__(
         self,
-        device_buffer: DeviceBuffer,
+        device_buffer: DeviceBuffer | SharedStoreView,
         device_manager: DeviceManager,
         address: tuple[str, int] = ("0.0.0.0", 12345),
+        workers: int = 1,
     ) -> None:
+        """
+        :param device_buffer: buffer the device data is read from
+        :param device_manager: device database
+        :param address: (host, port) to listen on
+        :param workers: number of server processes, more than one
+            requires the buffer to write to a `SharedStore`. The workers
+            serve device data from the store, history, health, on demand
+            requests and commands aren't available then.
+        """
+        if workers > 1 and (
+            not isinstance(device_buffer, DeviceBuffer)
+            or device_buffer.shared_store is None
+        ):
+            raise ValueError("multiple workers need a buffer with a shared store")
+
         self._dev_buf = device_buffer
         self._dev_man = device_manager
         self._address = copy(address)
+        self._workers = workers
+
+        # (method, route): time until the response started
+        self._route_latency: dict[tuple[str, str], Histogram] = {}
 
         self._app = FastAPI()
+        self._app.add_middleware(_RouteTimer, histograms=self._route_latency)
 
         # register endpoints
         self._setup_routes()
@@ -45,31 +200,359 @@ class HTTPServer:
 
         # device buffer
         @self._app.get("/device/{device_id}/data/{endpoint:path}")
-        async def get_device_data(device_id: int, endpoint: str) -> dict:
+        async def get_device_data(
+            device_id: int,
+            endpoint: str,
+            max_age: float | None = None,
+            if_none_match: str | None = Header(default=None),
+        ) -> Response:
             """
-            forwards device requests
+            forwards device requests, the buffered data is sent as is
+            without being validated or encoded again
 
             :param device_id: device request id
             :param endpoint: normal device endpoint
+            :param max_age: max. age of the data in seconds, older data is
+                requested again if the buffer allows on demand requests
+            :param if_none_match: entity tags the client already has
             """
             endpoint = endpoint.strip().rstrip("/")
-            debugger.trace(f'dev_buf: getting device {device_id}, "{endpoint}"')
+            debugger.trace('dev_buf: getting device %s, "%s"', device_id, endpoint)
 
-            data = self._dev_buf.get_device_data(device_id, endpoint)
+            # data, etag and age all come from the same record
+            entry = self._dev_buf.get_endpoint_data(device_id, endpoint)
 
-            if data == -1:
+            if entry == -1:
                 debugger.info("dev_buf: invalid endpoint")
                 raise HTTPException(
                     status_code=HTTPStatus.NOT_FOUND,
                 )
 
-            elif data is ...:
+            # worker, the data doesn't fit into the shared store
+            if entry == -2:
+                debugger.info("dev_buf: data too large for the shared store")
+                raise HTTPException(
+                    status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                )
+
+            if self._dev_buf.on_demand:
+                if entry.updated_at is None or (
+                    max_age is not None
+                    and time.time() - entry.updated_at > max_age
+                ):
+                    entry = await self._dev_buf.fetch_device_data(
+                        device_id,
+                        endpoint,
+                    )
+
+            if entry.encoded is None:
                 debugger.info("dev_buf: no data")
                 raise HTTPException(
                     status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
                 )
 
-            return data
+            # caching, data stays fresh until the next poll
+            age = max(time.time() - entry.updated_at, 0)
+            interval = self._dev_buf.get_poll_interval(device_id, endpoint)
+
+            headers = {
+                "Cache-Control": f"max-age={int(interval)}",
+                "Age": str(int(age)),
+            }
+
+            # when and how fast the data was requested
+            headers["X-Fetch-Finished"] = f"{entry.updated_at:.3f}"
+            if entry.duration is not None:
+                headers["X-Fetch-Started"] = f"{entry.started_at:.3f}"
+                headers["X-Fetch-Duration"] = f"{entry.duration:.6f}"
+
+            # restored after a restart, the device wasn't polled since
+            if entry.stale:
+                headers["Warning"] = '110 - "Response is Stale"'
+
+            if entry.etag is not None:
+                headers["ETag"] = entry.etag
+
+                if if_none_match is not None and _etag_matches(
+                    if_none_match,
+                    entry.etag,
+                ):
+                    return Response(
+                        status_code=HTTPStatus.NOT_MODIFIED,
+                        headers=headers,
+                    )
+
+            return Response(
+                content=entry.encoded,
+                media_type="application/json",
+                headers=headers,
+            )
+
+        @self._app.api_route(
+            "/device/{device_id}/command/{endpoint:path}",
+            methods=["POST", "PUT"],
+        )
+        async def send_command(
+            device_id: int,
+            endpoint: str,
+            body: tp.Any = Body(default=None),
+        ) -> Response:
+            """
+            forwards a write to a devices POST or PUT endpoint, writes to
+            the same device are sent one after another
+
+            :param device_id: device request id
+            :param endpoint: POST or PUT endpoint of the device
+            :param body: json body sent to the device
+            """
+            endpoint = endpoint.strip().rstrip("/")
+            debugger.trace(f'dev_buf: command to {device_id}, "{endpoint}"')
+
+            result = await self._dev_buf.send_command(device_id, endpoint, body)
+
+            if result == -1:
+                debugger.info("dev_buf: invalid command device or endpoint")
+                raise HTTPException(
+                    status_code=HTTPStatus.NOT_FOUND,
+                )
+
+            if result == -2:
+                raise HTTPException(
+                    status_code=HTTPStatus.NOT_IMPLEMENTED,
+                )
+
+            if result is None:
+                debugger.info("dev_buf: device unreachable")
+                raise HTTPException(
+                    status_code=HTTPStatus.BAD_GATEWAY,
+                )
+
+            status, content = result
+            return Response(
+                content=content,
+                status_code=status,
+                media_type="application/json",
+            )
+
+        @self._app.post("/devices/data")
+        async def get_batch_data(requested: list[_BatchRequest]) -> Response:
+            """
+            read multiple device endpoints at once
+
+            :param requested: (device_id, endpoint) pairs, leave either
+                one out to select all devices / endpoints
+            """
+            debugger.trace("dev_buf: batch read of %s items", len(requested))
+
+            items = self._dev_buf.get_batch_data(
+                (
+                    r.device_id,
+                    None if r.endpoint is None else r.endpoint.strip().rstrip("/"),
+                )
+                for r in requested
+            )
+
+            return Response(
+                content=b'{"items":' + _splice_items(items) + b"}",
+                media_type="application/json",
+            )
+
+        @self._app.get("/changes")
+        async def get_changes(
+            since: int = 0,
+            epoch: str | None = None,
+        ) -> Response:
+            """
+            all endpoints whose data changed after a sequence number,
+            removed endpoints have "removed": true. if "reset" is true,
+            the response contains everything and clients should drop the
+            endpoints they know that aren't in it
+
+            :param since: "seq" of the previous response, 0 for everything
+            :param epoch: "epoch" of the previous response, sequence
+                numbers restart if the server does
+            """
+            current = self._dev_buf.epoch
+            reset = epoch is not None and epoch != current
+
+            seq, items = self._dev_buf.get_changes(0 if reset else since)
+
+            # newer than the server, e.g. from before a restart
+            reset = reset or since > seq
+
+            return Response(
+                content=(
+                    b'{"epoch":' + json.dumps(current).encode()
+                    + b',"seq":' + str(seq).encode()
+                    + b',"reset":' + (b"true" if reset else b"false")
+                    + b',"changes":' + _splice_items(items) + b"}"
+                ),
+                media_type="application/json",
+            )
+
+        @self._app.get("/stream")
+        async def stream(
+            topic: list[str] = Query(default=["*"]),
+            max_queue: int = Query(default=64, ge=1, le=_MAX_STREAM_QUEUE),
+        ) -> StreamingResponse:
+            """
+            server-sent events of changed device data
+
+            :param topic: "*", "<device id>" or "<device id>/<endpoint>",
+                may be given multiple times
+            :param max_queue: max. pending updates (at most
+                `_MAX_STREAM_QUEUE`), if the client can't keep up the
+                oldest ones are dropped
+            """
+            try:
+                topics = [_parse_topic(t) for t in topic]
+
+            except ValueError:
+                raise HTTPException(
+                    status_code=HTTPStatus.UNPROCESSABLE_ENTITY,
+                )
+
+            subscription = self._dev_buf.subscribe(topics, max_queue)
+            debugger.trace(f"dev_buf: new subscription to {topics}")
+
+            async def events():
+                try:
+                    while True:
+                        messages = await subscription.get(timeout=15)
+
+                        # keep idle connections open
+                        if not messages:
+                            yield b": keepalive\n\n"
+                            continue
+
+                        if subscription.dropped:
+                            dropped, subscription.dropped = subscription.dropped, 0
+                            yield f"event: dropped\ndata: {dropped}\n\n".encode()
+
+                        yield b"".join(
+                            b"event: update\ndata: " + m + b"\n\n" for m in messages
+                        )
+
+                finally:
+                    self._dev_buf.unsubscribe(subscription)
+                    debugger.trace(f"dev_buf: subscription to {topics} closed")
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        @self._app.get("/device/{device_id}/history/{endpoint:path}")
+        async def get_device_history(
+            device_id: int,
+            endpoint: str,
+            start: float | None = None,
+            end: float | None = None,
+            buckets: int = Query(default=60, ge=1, le=_MAX_HISTORY_BUCKETS),
+        ) -> dict:
+            """
+            downsampled history of an endpoints numeric fields
+
+            :param device_id: device request id
+            :param endpoint: normal device endpoint
+            :param start: window start (unix seconds)
+            :param end: window end (unix seconds)
+            :param buckets: number of buckets the window is split into,
+                at most `_MAX_HISTORY_BUCKETS`
+            """
+            endpoint = endpoint.strip().rstrip("/")
+            history = self._dev_buf.get_device_history(
+                device_id,
+                endpoint,
+                start,
+                end,
+                buckets,
+            )
+
+            if history == -1:
+                raise HTTPException(
+                    status_code=HTTPStatus.NOT_FOUND,
+                )
+
+            return history
+
+        @self._app.get("/device/{device_id}/health")
+        async def get_device_health(device_id: int) -> dict:
+            """
+            reachability of a buffered device
+
+            :param device_id: device request id
+            """
+            health = self._dev_buf.get_device_health(device_id)
+
+            if health == -1:
+                raise HTTPException(
+                    status_code=HTTPStatus.NOT_FOUND,
+                )
+
+            return health
+
+        @self._app.get("/staleness")
+        async def get_staleness(
+            device_id: int | None = None,
+            target: float | None = None,
+        ) -> dict:
+            """
+            how far past their interval the endpoints data gets before it's
+            replaced, to check a freshness target
+
+            :param device_id: only this device, all if not given
+            :param target: max. acceptable lateness in seconds
+            """
+            staleness = self._dev_buf.get_staleness(device_id, target)
+
+            if staleness == -1:
+                raise HTTPException(
+                    status_code=HTTPStatus.NOT_FOUND,
+                )
+
+            return staleness
+
+        @self._app.get("/metrics")
+        async def get_metrics() -> Response:
+            """metrics of the poller and this server, prometheus format"""
+            writer = MetricsWriter()
+            self._dev_buf.write_metrics(writer)
+
+            for (method, route), histogram in list(self._route_latency.items()):
+                writer.histogram(
+                    "iot_http_request_duration_seconds",
+                    histogram,
+                    "time until the response started",
+                    method=method,
+                    route=route,
+                )
+
+            return Response(
+                content=writer.render(),
+                media_type="text/plain; version=0.0.4",
+            )
+
+        @self._app.get("/profile")
+        async def get_profile(reset: bool = False) -> dict:
+            """
+            timings of the profiled functions in this process
+
+            :param reset: clear the timings after reading them
+            """
+            spans = profiler.dump()
+
+            if reset:
+                profiler.reset()
+
+            return {
+                "enabled": profiler.enabled,
+                "spans": spans,
+            }
+
+        @self._app.get("/health")
+        async def get_health() -> dict:
+            """reachability of all buffered devices"""
+            return {
+                "devices": self._dev_buf.get_health(),
+            }
 
         # device manager
         @self._app.get("/device/{device_id}")
@@ -125,9 +608,8 @@ class HTTPServer:
             device = self._dev_man.get_device(did)
             return device.to_dict()
 
-    async def serve(self):
-        """Run this buffer as its own FastAPI server."""
-        config = uvicorn.Config(
+    def _config(self) -> uvicorn.Config:
+        return uvicorn.Config(
             self._app,
             host=self._address[0],
             port=self._address[1],
@@ -140,5 +622,58 @@ class HTTPServer:
             #     # DebugLevel.trace: "trace"
             # }[debugger.debug_level]
         )
+
+    async def serve(self):
+        """Run this buffer as its own FastAPI server."""
+        config = self._config()
+
+        if self._workers > 1:
+            await self._serve_workers(config)
+            return
+
         server = uvicorn.Server(config)
         await server.serve()
+
+    async def _serve_workers(self, config: uvicorn.Config) -> None:
+        """
+        run the server in worker processes sharing one socket, returns
+        once all of them stopped
+        """
+        sock = config.bind_socket()
+
+        # forking a process with running threads isn't safe
+        context = mp.get_context("spawn")
+        workers = [
+            context.Process(
+                target=_run_worker,
+                args=(
+                    index,
+                    sock,
+                    self._dev_buf.shared_store.path,
+                    self._dev_man.db_path,
+                    self._address,
+                    debugger.child_settings(f"worker_{index}"),
+                ),
+                name=f"iot_manager_worker_{index}",
+                daemon=True,
+            )
+            for index in range(self._workers)
+        ]
+
+        for worker in workers:
+            worker.start()
+
+        debugger.log(f"http: started {len(workers)} workers")
+
+        try:
+            for worker in workers:
+                await asyncio.to_thread(worker.join)
+
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                    worker.join()
+
+            sock.close()
+            debugger.log("http: workers stopped")
@@ -0,0 +1,253 @@
+"""
+Prometheus style metrics.
+
+| ``Path``: iot_manager/core/_metrics.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+
+Everything that is recorded on a hot path is allocated up front and
+updated with plain integer / float additions, no locks are taken. Under
+the GIL this can, very rarely, lose an increment when two threads update
+the same value at once, which is acceptable for monitoring.
+"""
+
+import bisect
+import typing as tp
+from dataclasses import dataclass, field
+
+# seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LATENESS_BUCKETS = (
+    0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300,
+)
+
+
+class Histogram:
+    """
+    Fixed bucket histogram.
+
+    :ivar bounds: upper bounds of the buckets (inclusive).
+    :ivar counts: observations per bucket, the last one is +Inf.
+    :ivar sum: sum of all observations.
+    """
+
+    # region InstanceVars
+    bounds: tuple[float, ...]
+    counts: list[int]
+    sum: float
+    # endregion
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Record a single value.
+
+        :param value: observed value.
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other: "Histogram") -> None:
+        """
+        Add the observations of a histogram with the same buckets.
+
+        :param other: histogram to add.
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+
+        self.sum += other.sum
+
+    def fraction_below(self, value: float) -> float | None:
+        """
+        Estimate the fraction of observations <= a value, linear within
+        the bucket containing it.
+
+        :param value: upper limit.
+        :return: None if there are no observations.
+        """
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+
+        index = bisect.bisect_left(self.bounds, value)
+        below = sum(counts[:index])
+
+        # the +Inf bucket has no upper bound to interpolate to
+        if index < len(self.bounds):
+            lower = self.bounds[index - 1] if index else 0
+            width = self.bounds[index] - lower
+            below += counts[index] * min(max(value - lower, 0) / width, 1)
+
+        else:
+            below += counts[index]
+
+        return below / total
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Estimate a quantile, linear within the bucket containing it.
+
+        :param q: quantile, 0 to 1.
+        :return: None if there are no observations, the largest bound if
+            the quantile is in the +Inf bucket.
+        """
+        counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if index == len(self.bounds):
+                    return self.bounds[-1]
+
+                lower = self.bounds[index - 1] if index else 0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+
+            seen += count
+
+        return self.bounds[-1]
+
+    def summary(self, target: float | None = None) -> dict:
+        """
+        :param target: also estimate the fraction of observations <= this.
+        :return: count, mean and estimated median, 90th and 99th
+            percentile (None if empty).
+        """
+        total = sum(self.counts)
+        out = {
+            "count": total,
+            "mean": self.sum / total if total else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+        if target is not None:
+            out["within_target"] = self.fraction_below(target)
+
+        return out
+
+
+@dataclass(slots=True)
+class EndpointStats:
+    """Request statistics of a single endpoint."""
+
+    latency: Histogram = field(default_factory=Histogram)  # successes only
+    # seconds past the interval the data got before it was replaced
+    lateness: Histogram = field(
+        default_factory=lambda: Histogram(LATENESS_BUCKETS)
+    )
+    success: int = 0
+    timeout: int = 0
+    connection_error: int = 0
+    invalid_data: int = 0
+
+    def merge(self, other: "EndpointStats") -> None:
+        """
+        Add the requests of another statistics object, e.g. of another
+        process polling the same endpoint.
+
+        :param other: statistics to add.
+        """
+        self.latency.merge(other.latency)
+        self.lateness.merge(other.lateness)
+        self.success += other.success
+        self.timeout += other.timeout
+        self.connection_error += other.connection_error
+        self.invalid_data += other.invalid_data
+
+
+def _format_labels(labels: dict[str, tp.Any]) -> str:
+    if not labels:
+        return ""
+
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+        parts.append(f'{key}="{value}"')
+
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsWriter:
+    """
+    Builds the text exposition format, samples of the same metric are
+    grouped no matter in which order they're written.
+
+    :ivar _families: metric name -> its lines.
+    """
+
+    # region InstanceVars
+    _families: dict[str, list[str]]
+    # endregion
+
+    def __init__(self) -> None:
+        self._families = {}
+
+    def _declare(self, name: str, kind: str, help_text: str) -> list[str]:
+        """
+        :return: lines of the metric, type and help are added once.
+        """
+        lines = self._families.get(name)
+
+        if lines is None:
+            lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            self._families[name] = lines
+
+        return lines
+
+    def counter(
+        self,
+        name: str,
+        value: float,
+        help_text: str,
+        **labels,
+    ) -> None:
+        lines = self._declare(name, "counter", help_text)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    def gauge(
+        self,
+        name: str,
+        value: float,
+        help_text: str,
+        **labels,
+    ) -> None:
+        lines = self._declare(name, "gauge", help_text)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    def histogram(
+        self,
+        name: str,
+        histogram: Histogram,
+        help_text: str,
+        **labels,
+    ) -> None:
+        lines = self._declare(name, "histogram", help_text)
+
+        # copied first, the histogram may be updated meanwhile
+        counts = list(histogram.counts)
+        total = 0
+
+        for bound, count in zip((*histogram.bounds, "+Inf"), counts):
+            total += count
+            bucket_labels = _format_labels({**labels, "le": bound})
+            lines.append(f"{name}_bucket{bucket_labels} {total}")
+
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {total}")
+
+    def render(self) -> bytes:
+        return "".join(
+            line + "\n" for lines in self._families.values() for line in lines
+        ).encode()
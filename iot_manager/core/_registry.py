@@ -0,0 +1,102 @@
+"""
+Immutable device registry with cheap single entry updates.
+
+| ``Path``: iot_manager/core/_registry.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import typing as tp
+
+
+class Registry[K, V](tp.Mapping[K, V]):
+    """
+    Immutable mapping, changes return a new registry.
+
+    Entries are spread over a fixed number of buckets by their hash. A
+    change copies the affected bucket and the bucket list, everything
+    else is shared with the previous registry, so an update costs about
+    ``len / n_buckets + n_buckets`` instead of ``len``.
+
+    Iteration is in bucket order, not in insertion order.
+
+    :cvar n_buckets: number of buckets.
+
+    :ivar _buckets: entries of every bucket, never modified.
+    :ivar _len: number of entries.
+    """
+
+    # region ClassVars
+    n_buckets: tp.ClassVar[int] = 256
+    # endregion
+
+    # region InstanceVars
+    _buckets: tuple[dict[K, V], ...]
+    _len: int
+    # endregion
+
+    def __init__(
+        self,
+        buckets: tuple[dict[K, V], ...] | None = None,
+        length: int = 0,
+    ) -> None:
+        if buckets is None:
+            buckets = ({},) * self.n_buckets
+
+        self._buckets = buckets
+        self._len = length
+
+    def _bucket(self, key: K) -> int:
+        return hash(key) % len(self._buckets)
+
+    def __getitem__(self, key: K) -> V:
+        return self._buckets[self._bucket(key)][key]
+
+    def get(self, key: K, default: tp.Any = None) -> V | tp.Any:
+        return self._buckets[self._bucket(key)].get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._buckets[self._bucket(key)]
+
+    def __iter__(self) -> tp.Iterator[K]:
+        for bucket in self._buckets:
+            yield from bucket
+
+    def __len__(self) -> int:
+        return self._len
+
+    def set(self, key: K, value: V) -> tp.Self:
+        """
+        Add or replace an entry.
+
+        :param key: entry key.
+        :param value: entry value.
+        :return: new registry.
+        """
+        index = self._bucket(key)
+        bucket = dict(self._buckets[index])
+        length = self._len + (key not in bucket)
+        bucket[key] = value
+
+        buckets = list(self._buckets)
+        buckets[index] = bucket
+
+        return type(self)(tuple(buckets), length)
+
+    def delete(self, key: K) -> tp.Self:
+        """
+        Remove an entry.
+
+        :param key: entry key.
+        :return: new registry.
+        :raises KeyError: if the key isn't in the registry.
+        """
+        index = self._bucket(key)
+        bucket = dict(self._buckets[index])
+        del bucket[key]
+
+        buckets = list(self._buckets)
+        buckets[index] = bucket
+
+        return type(self)(tuple(buckets), self._len - 1)
@@ -0,0 +1,134 @@
+"""
+Deadline based scheduling of device polls.
+
+| ``Path``: iot_manager/core/_scheduler.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import heapq
+import threading
+import typing as tp
+
+
+class DeadlineScheduler:
+    """
+    Min-heap of device ids keyed on their next due time.
+
+    Rescheduled or removed devices leave their old heap entry behind,
+    stale entries are recognized by comparing against ``_due`` and
+    skipped when popped.
+
+    :cvar _compact_factor: rebuild the heap once it holds this many
+        times more entries than scheduled devices.
+
+    :ivar _heap: (due, device id) entries.
+    :ivar _due: current due time of every scheduled device.
+    :ivar _lock: guards heap and due times.
+    """
+
+    # region ClassVars
+    _compact_factor: tp.ClassVar[int] = 4
+    # endregion
+
+    # region InstanceVars
+    _heap: list[tuple[float, int]]
+    _due: dict[int, float]
+    _lock: threading.Lock
+    # endregion
+
+    def __init__(self) -> None:
+        self._heap = []
+        self._due = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, device_id: int) -> bool:
+        return device_id in self._due
+
+    def schedule(self, device_id: int, due: float) -> None:
+        """
+        Schedule (or reschedule) a device.
+
+        :param device_id: device to schedule.
+        :param due: monotonic time the device is due at.
+        """
+        with self._lock:
+            self._due[device_id] = due
+            heapq.heappush(self._heap, (due, device_id))
+
+            if len(self._heap) > self._compact_factor * max(len(self._due), 16):
+                self._compact()
+
+    def advance(self, device_id: int, due: float) -> bool:
+        """
+        Move a scheduled device to an earlier due time.
+
+        :param device_id: device to reschedule.
+        :param due: new monotonic due time.
+        :return: True if the device was scheduled later than `due`.
+        """
+        with self._lock:
+            current = self._due.get(device_id)
+            if current is None or current <= due:
+                return False
+
+            self._due[device_id] = due
+            heapq.heappush(self._heap, (due, device_id))
+
+        return True
+
+    def remove(self, device_id: int) -> bool:
+        """
+        Remove a device from the schedule.
+
+        :param device_id: device to remove.
+        :return: True if the device was scheduled.
+        """
+        with self._lock:
+            return self._due.pop(device_id, None) is not None
+
+    def pop_due(self, now: float) -> list[tuple[int, float]]:
+        """
+        Remove and return all devices that are due.
+
+        :param now: current monotonic time.
+        :return: list of (device id, due time).
+        """
+        out = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, device_id = heapq.heappop(self._heap)
+
+                # skip stale entries
+                if self._due.get(device_id) != due:
+                    continue
+
+                self._due.pop(device_id)
+                out.append((device_id, due))
+
+        return out
+
+    def next_deadline(self) -> float | None:
+        """
+        Get the earliest due time.
+
+        :return: monotonic time, None if nothing is scheduled.
+        """
+        with self._lock:
+            while self._heap:
+                due, device_id = self._heap[0]
+                if self._due.get(device_id) == due:
+                    return due
+
+                heapq.heappop(self._heap)
+
+        return None
+
+    def _compact(self) -> None:
+        """Drop all stale entries (lock must be held)."""
+        self._heap = [(due, did) for did, due in self._due.items()]
+        heapq.heapify(self._heap)
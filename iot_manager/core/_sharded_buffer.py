@@ -0,0 +1,499 @@
+"""
+Device buffer that polls from multiple worker processes.
+
+| ``Path``: iot_manager/core/_sharded_buffer.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import asyncio
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+import typing as tp
+from copy import copy
+from multiprocessing.connection import Connection
+
+from icecream import ic
+
+from ..utils.debugging import debugger
+from ._datatypes import (
+    BackpressurePolicy,
+    DeviceHealth,
+    IOTDevice,
+    PollEngine,
+    PollSpread,
+)
+from ._device_buffer import DeviceBuffer, _DeviceParams
+from ._metrics import EndpointStats, Histogram
+from ._shared_store import SharedStore
+
+
+class _ShardBuffer(DeviceBuffer):
+    """
+    Polling side of a shard, runs in the worker process and sends every
+    result to the parent.
+
+    :ivar _results: queue read by the parent.
+    """
+
+    # region InstanceVars
+    _results: mp.Queue
+    # endregion
+
+    def __init__(self, results: mp.Queue, **kwargs) -> None:
+        self._results = results
+        super().__init__(**kwargs)
+
+    def _store_data(
+        self,
+        device_id: int,
+        endpoint: str,
+        data: dict,
+        encoded: bytes | None = None,
+        received_at: float | None = None,
+        duration: float | None = None,
+    ) -> None:
+        super()._store_data(
+            device_id,
+            endpoint,
+            data,
+            encoded,
+            received_at,
+            duration,
+        )
+
+        device = self._clients.get(device_id)
+        if device is None or endpoint not in device["data"]:
+            return
+
+        # already encoded, the parent doesn't have to do it again
+        entry = device["data"][endpoint]
+        self._results.put((
+            "data",
+            device_id,
+            endpoint,
+            entry.data,
+            entry.encoded,
+            entry.updated_at,
+            entry.duration,
+        ))
+
+    def _record_result(
+        self,
+        device_id: int,
+        device: _DeviceParams,
+        success: bool,
+    ) -> None:
+        previous = device["health"].state
+        super()._record_result(device_id, device, success)
+
+        # successes of healthy devices don't change anything
+        if not success or previous != DeviceHealth.HEALTHY:
+            # copied now, the queue pickles it later on another thread
+            self._results.put(("health", device_id, copy(device["health"])))
+
+    def record_remote_result(self, device_id: int, success: bool) -> None:
+        """
+        record a request the parent made to one of this shards devices
+        (on demand reads, commands), so this shard's breaker knows about it
+        """
+        device = self._clients.get(device_id)
+        if device is not None:
+            self._record_result(device_id, device, success)
+
+    def send_stats(self, index: int) -> None:
+        """
+        send the pollers state and request statistics to the parent, they
+        replace the ones this shard sent before
+        """
+        stats = {}
+        for device_id, device in list(self._clients.items()):
+            for endpoint, endpoint_stats in list(device["stats"].items()):
+                # copied, the pollers keep updating them. the lateness is
+                # recorded by the parent, it stores the data too
+                latency = Histogram(endpoint_stats.latency.bounds)
+                latency.merge(endpoint_stats.latency)
+
+                stats[(device_id, endpoint)] = EndpointStats(
+                    latency=latency,
+                    success=endpoint_stats.success,
+                    timeout=endpoint_stats.timeout,
+                    connection_error=endpoint_stats.connection_error,
+                    invalid_data=endpoint_stats.invalid_data,
+                )
+
+        self._results.put(("stats", index, self._poller_state(), stats))
+
+
+def _run_shard(
+    index: int,
+    commands: Connection,
+    results: mp.Queue,
+    settings: dict,
+    debug_settings: dict,
+    stats_interval: float,
+) -> None:
+    """
+    entry point of a worker process, polls the devices it's told to
+    until it's stopped
+
+    :param index: shard number
+    :param commands: ("add", ...), ("remove", device id),
+        ("result", device id, success) or ("stop",)
+    :param results: queue the polled data is sent to
+    :param settings: `DeviceBuffer` arguments
+    :param debug_settings: see `debugger.child_settings`
+    :param stats_interval: seconds between sending the statistics
+    """
+    # the parent stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    ic.configureOutput(prefix=lambda: f"shard {index: <4} |> ")
+    debugger.init(**debug_settings)
+
+    buffer = _ShardBuffer(results, **settings)
+
+    # the async engine needs a loop, commands are read on this thread
+    runner = None
+    if buffer.engine == PollEngine.ASYNC:
+        runner = threading.Thread(target=asyncio.run, args=(buffer.run(),))
+        runner.start()
+
+    try:
+        next_stats = time.monotonic() + stats_interval
+        while True:
+            if not commands.poll(max(next_stats - time.monotonic(), 0)):
+                buffer.send_stats(index)
+                next_stats = time.monotonic() + stats_interval
+                continue
+
+            command, *args = commands.recv()
+
+            if command == "add":
+                buffer.add_device(*args)
+
+            elif command == "remove":
+                buffer.remove_device(*args)
+
+            elif command == "result":
+                buffer.record_remote_result(*args)
+
+            elif command == "stop":
+                break
+
+    except EOFError:
+        # parent is gone
+        pass
+
+    finally:
+        buffer.shutdown()
+
+        if runner is not None:
+            runner.join()
+
+
+class ShardedDeviceBuffer(DeviceBuffer):
+    """
+    `DeviceBuffer` that splits the polling across worker processes.
+
+    Device ids are hashed onto ``shards`` worker processes, each of which
+    polls its devices with its own `DeviceBuffer`. Results are sent back
+    over a pipe and stored here, so reading works exactly like with a
+    single `DeviceBuffer` (on demand requests are made by this process).
+
+    Adaptive poll intervals aren't supported, reads happen in this
+    process while the intervals are managed by the workers.
+
+    The request statistics of the shards are sent every
+    ``_stats_interval`` seconds, so metrics lag behind by up to that.
+
+    :cvar _stop_timeout: seconds a worker gets to stop before it's
+        terminated.
+    :cvar _stats_interval: seconds between the statistics of a shard.
+
+    :ivar _commands: command pipe of every shard.
+    :ivar _workers: worker processes.
+    :ivar _results: results of all shards.
+    :ivar _receiver: thread storing the results.
+    :ivar _commands_lock: devices may be added from multiple threads.
+    :ivar _shard_states: latest poller state of every shard, see
+        `DeviceBuffer._poller_state`.
+    :ivar _shard_stats: latest request statistics of every shard.
+    """
+
+    # region ClassVars
+    _stop_timeout: tp.ClassVar[float] = 10
+    _stats_interval: tp.ClassVar[float] = 5
+    # endregion
+
+    # region InstanceVars
+    _commands: list[Connection]
+    _workers: list[mp.Process]
+    _results: mp.Queue
+    _receiver: threading.Thread
+    _commands_lock: threading.Lock
+    _shard_states: list[tuple[int, int, int, int]]
+    _shard_stats: list[dict[tuple[int, str], EndpointStats]]
+    # endregion
+
+    def __init__(
+        self,
+        shards: int | None = None,
+        engine: PollEngine = PollEngine.THREADED,
+        max_concurrency: int = 256,
+        max_pending: int = 64,
+        backpressure: BackpressurePolicy = BackpressurePolicy.COALESCE,
+        on_demand: bool = False,
+        spread: PollSpread = PollSpread.NONE,
+        max_jitter: float = 0.1,
+        snapshot_path: str | None = None,
+        snapshot_interval: float = 60,
+        shared_store: SharedStore | None = None,
+    ) -> None:
+        """
+        :param shards: number of worker processes, one per cpu if None
+        :param engine: polling engine of the workers (and on demand
+            requests)
+        :param max_concurrency: see `DeviceBuffer`, per shard
+        :param max_pending: see `DeviceBuffer`, per shard
+        :param backpressure: see `DeviceBuffer`
+        :param on_demand: see `DeviceBuffer`
+        :param spread: see `DeviceBuffer`
+        :param max_jitter: see `DeviceBuffer`
+        :param snapshot_path: see `DeviceBuffer`
+        :param snapshot_interval: see `DeviceBuffer`
+        :param shared_store: see `DeviceBuffer`, written by this process
+        """
+        if shards is None:
+            shards = os.cpu_count() or 1
+
+        # no devices are scheduled here, this only handles snapshots (and
+        # validates the settings before the shards get them)
+        super().__init__(
+            engine=engine,
+            on_demand=on_demand,
+            max_jitter=max_jitter,
+            snapshot_path=snapshot_path,
+            snapshot_interval=snapshot_interval,
+            shared_store=shared_store,
+        )
+
+        settings = {
+            "engine": engine,
+            "max_concurrency": max_concurrency,
+            "max_pending": max_pending,
+            "backpressure": backpressure,
+            "spread": spread,
+            "max_jitter": max_jitter,
+        }
+
+        # forking a process with running threads isn't safe
+        context = mp.get_context("spawn")
+
+        self._results = context.Queue()
+        self._commands = []
+        self._workers = []
+        self._commands_lock = threading.Lock()
+        self._shard_states = [(0, 0, 0, 0)] * shards
+        self._shard_stats = [{} for _ in range(shards)]
+
+        for index in range(shards):
+            receiver, sender = context.Pipe(duplex=False)
+
+            worker = context.Process(
+                target=_run_shard,
+                args=(
+                    index,
+                    receiver,
+                    self._results,
+                    settings,
+                    debugger.child_settings(f"shard_{index}"),
+                    self._stats_interval,
+                ),
+                name=f"iot_manager_shard_{index}",
+                daemon=True,
+            )
+            worker.start()
+
+            self._commands.append(sender)
+            self._workers.append(worker)
+
+        self._receiver = threading.Thread(
+            target=self._receive_results,
+            daemon=True,
+        )
+        self._receiver.start()
+
+        debugger.log(f"dev_buf: started {shards} shards")
+
+    @property
+    def shards(self) -> int:
+        return len(self._workers)
+
+    def shard_of(self, device_id: int) -> int:
+        """
+        :returns: index of the shard polling the given device
+        """
+        return hash(device_id) % len(self._commands)
+
+    def _send(self, device_id: int, command: tuple) -> None:
+        """
+        send a command to the shard of a device
+        """
+        with self._commands_lock:
+            self._commands[self.shard_of(device_id)].send(command)
+
+    def _receive_results(self) -> None:
+        """
+        background task, stores the results of all shards
+        """
+        while True:
+            message = self._results.get()
+
+            # sent on shutdown
+            if message is None:
+                break
+
+            kind, device_id, *args = message
+
+            if kind == "stats":
+                # device_id is the shard index here
+                state, stats = args
+                self._shard_states[device_id] = state
+                self._shard_stats[device_id] = stats
+
+            elif kind == "data":
+                self._store_data(device_id, *args)
+
+            elif kind == "health":
+                # the shard's breaker includes the requests made here, see
+                # `_record_result`
+                device = self._clients.get(device_id)
+                if device is not None:
+                    device["health"] = args[0]
+
+    def add_device(
+        self,
+        device: IOTDevice,
+        interval_s: float,
+        max_parallel: int = 1,
+        adaptive_range: tuple[float, float] | None = None,
+        history_size: int = 0,
+        history_fields: int = 8,
+    ) -> int:
+        """
+        add an IOT device to the request list of its shard, see
+        `DeviceBuffer.add_device`
+
+        :raises ValueError: if `adaptive_range` is given
+        """
+        if adaptive_range is not None:
+            raise ValueError("adaptive intervals aren't supported when sharded")
+
+        return super().add_device(
+            device,
+            interval_s,
+            max_parallel,
+            history_size=history_size,
+            history_fields=history_fields,
+        )
+
+    def _record_result(
+        self,
+        device_id: int,
+        device: _DeviceParams,
+        success: bool,
+    ) -> None:
+        """
+        result of a request made by this process. the device is polled by
+        its shard, so it's never scheduled here, the shard's breaker gets
+        the result instead and sends its new state back
+        """
+        if success:
+            device["health"].record_success()
+
+        else:
+            device["health"].record_failure(time.monotonic())
+
+        try:
+            self._send(device_id, ("result", device_id, success))
+
+        except OSError:
+            # shard already stopped
+            pass
+
+    def _poller_state(self) -> tuple[int, int, int, int]:
+        """
+        pollers of all shards (as last sent) and on demand requests
+        """
+        states = [super()._poller_state(), *self._shard_states]
+        return tuple(sum(values) for values in zip(*states))
+
+    def _endpoint_stats(
+        self,
+        device_id: int,
+        endpoint: str,
+        stats: EndpointStats,
+    ) -> EndpointStats:
+        """
+        requests of the shard (as last sent) and of this process
+        """
+        remote = self._shard_stats[self.shard_of(device_id)].get(
+            (device_id, endpoint),
+        )
+        if remote is None:
+            return stats
+
+        merged = EndpointStats()
+        merged.merge(stats)
+        merged.merge(remote)
+
+        return merged
+
+    def _start_polling(
+        self,
+        device_id: int,
+        device: _DeviceParams,
+        first_poll: float,
+    ) -> None:
+        self._send(device_id, (
+            "add",
+            device["device"],
+            device["interval"],
+            device["max_parallel"],
+        ))
+
+    def _stop_polling(self, device_id: int) -> None:
+        self._send(device_id, ("remove", device_id))
+
+    def shutdown(self) -> None:
+        if self._workers:
+            debugger.trace("dev_buf: stopping shards ...")
+
+            with self._commands_lock:
+                for commands in self._commands:
+                    try:
+                        commands.send(("stop",))
+
+                    except OSError:
+                        # worker already died
+                        pass
+
+            for worker in self._workers:
+                worker.join(self._stop_timeout)
+
+                if worker.is_alive():
+                    debugger.warning(f"dev_buf: terminating {worker.name}")
+                    worker.terminate()
+
+            # all results are in, stop the receiver
+            self._results.put(None)
+            self._receiver.join()
+
+            self._workers.clear()
+
+        super().shutdown()
@@ -0,0 +1,861 @@
+"""
+Memory mapped store of buffered device data, shared between processes.
+
+| ``Path``: iot_manager/core/_shared_store.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+
+File layout (little endian)::
+
+    header  magic (8 bytes), slot size, number of slots (uint32 each),
+            generation, sequence number (uint64 each), epoch (16 bytes)
+    slots   one fixed size slot per (device id, endpoint)
+
+Each slot starts with a sequence lock, the writer makes it odd while
+writing and even again afterwards. Readers retry until they read the
+same even value before and after copying a slot, so they never lock.
+The generation is increased whenever slots are assigned or freed,
+readers only rebuild their slot index if it changed.
+
+Freed slots are kept as tombstones (device id, endpoint and the sequence
+number of the removal) until they're needed again, so `changes` can
+report removed endpoints.
+"""
+
+import asyncio
+import json
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+import typing as tp
+from types import EllipsisType
+
+from ..utils.debugging import debugger
+from ._datatypes import EndpointData
+from ._metrics import MetricsWriter
+from ._subscriptions import Subscription, SubscriptionHub, Topic
+
+_MAGIC = b"IOTSTOR2"
+_HEADER = struct.Struct("<8sIIQQ16s")
+_GENERATION_OFFSET = 16
+_SEQ_OFFSET = 24
+
+# lock, seq, device id, updated at, fetch duration, interval,
+# endpoint length, data length, flags, etag
+_SLOT = struct.Struct("<QQqdddHIB18s")
+_FLAGS_OFFSET = struct.calcsize("<QQqdddHI")
+_LOCK = struct.Struct("<Q")
+_LOCK_SEQ = struct.Struct("<QQ")
+_MAX_ENDPOINT = 64
+
+# slot flags
+_USED = 1
+_HAS_DATA = 2
+_STALE = 4
+_POLLED = 8
+_REMOVED = 16  # tombstone, not used
+_TOO_LARGE = 32  # the current data didn't fit, the slot has none
+
+
+# "data" slot of `EndpointData`, set directly by `_StoredEndpointData`
+_DATA_SLOT = EndpointData.__dict__["data"]
+_UNDECODED = object()
+
+
+class _StoredEndpointData(EndpointData):
+    """
+    `EndpointData` read from the store, the payload is only decoded when
+    `data` is accessed (most reads only need `encoded`).
+    """
+
+    __slots__ = ()
+
+    @property
+    def data(self) -> dict | EllipsisType:
+        data = _DATA_SLOT.__get__(self, type(self))
+
+        if data is _UNDECODED:
+            data = json.loads(self.encoded)
+            _DATA_SLOT.__set__(self, data)
+
+        return data
+
+    @data.setter
+    def data(self, value: dict | EllipsisType) -> None:
+        # only used by __init__, the instances are frozen otherwise
+        _DATA_SLOT.__set__(self, value)
+
+
+class SharedStore:
+    """
+    Fixed size slots of encoded endpoint data in a memory mapped file.
+
+    One process creates the store and writes to it (`create`), any number
+    of processes may open it for reading (`open`).
+
+    :cvar _read_attempts: tries to read a slot that's being written, after
+        which the slot is treated as missing (e.g. if the writer died
+        while writing it).
+
+    :ivar path: store file, put it on a tmpfs (e.g. /dev/shm) to keep it
+        in memory.
+    :ivar slot_size: bytes per slot, see `capacity`.
+    :ivar n_slots: max. number of stored endpoints.
+    :ivar _map: mapped file.
+    :ivar _writable: if this instance created the store.
+    :ivar _slots: (device id, endpoint) -> slot, rebuilt by readers.
+    :ivar _polled: stored endpoints that are polled.
+    :ivar _generation: generation ``_slots`` was built for.
+    :ivar _free: unused slots, tombstones first (writer only).
+    :ivar _tombstones: slots of removed endpoints.
+    :ivar _too_large: endpoints whose data didn't fit, warned about once
+        (writer only).
+    :ivar _lock: serializes writers of this process.
+    """
+
+    # region ClassVars
+    _read_attempts: tp.ClassVar[int] = 1000
+    # endregion
+
+    # region InstanceVars
+    path: str
+    slot_size: int
+    n_slots: int
+    _map: mmap.mmap
+    _writable: bool
+    _slots: dict[tuple[int, str], int]
+    _polled: set[tuple[int, str]]
+    _generation: int
+    _free: list[int]
+    _tombstones: set[int]
+    _too_large: set[tuple[int, str]]
+    _lock: threading.Lock
+    # endregion
+
+    def __init__(self, path: str, data: mmap.mmap, writable: bool) -> None:
+        magic, slot_size, n_slots, _, _, _ = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("not a shared store file")
+
+        self.path = path
+        self.slot_size = slot_size
+        self.n_slots = n_slots
+        self._map = data
+        self._writable = writable
+        self._slots = {}
+        self._polled = set()
+        self._generation = -1
+        self._free = list(reversed(range(n_slots))) if writable else []
+        self._tombstones = set()
+        self._too_large = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        n_slots: int = 1024,
+        slot_size: int = 4096,
+        max_payload: int | None = None,
+    ) -> tp.Self:
+        """
+        Create an empty store, replaces an existing one.
+
+        :param path: store file.
+        :param n_slots: max. number of stored endpoints.
+        :param slot_size: bytes per endpoint, including its metadata.
+        :param max_payload: largest expected encoded payload in bytes.
+        :return: writable store.
+        :raises ValueError: if a slot can't hold `max_payload` bytes.
+        """
+        if slot_size <= _SLOT.size + _MAX_ENDPOINT:
+            raise ValueError(f"slot_size must be > {_SLOT.size + _MAX_ENDPOINT}")
+
+        capacity = slot_size - _SLOT.size - _MAX_ENDPOINT
+        if max_payload is not None and max_payload > capacity:
+            raise ValueError(
+                f"slot_size must be >= {_SLOT.size + _MAX_ENDPOINT + max_payload}"
+                f" for payloads of {max_payload} bytes"
+            )
+
+        size = _HEADER.size + n_slots * slot_size
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            data = mmap.mmap(fd, size, access=mmap.ACCESS_WRITE)
+
+        finally:
+            os.close(fd)
+
+        _HEADER.pack_into(
+            data,
+            0,
+            _MAGIC,
+            slot_size,
+            n_slots,
+            0,
+            0,
+            secrets.token_hex(8).encode(),
+        )
+        return cls(path, data, writable=True)
+
+    @classmethod
+    def open(cls, path: str) -> tp.Self:
+        """
+        Open an existing store for reading.
+
+        :param path: store file.
+        :return: read only store.
+        """
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(path, data, writable=False)
+
+    @property
+    def seq(self) -> int:
+        """Sequence number of the newest change."""
+        return _LOCK.unpack_from(self._map, _SEQ_OFFSET)[0]
+
+    @property
+    def epoch(self) -> str:
+        """Random id of the store, new for every `create`."""
+        return _HEADER.unpack_from(self._map, 0)[5].decode()
+
+    @property
+    def capacity(self) -> int:
+        """Max. size of an encoded payload in bytes."""
+        return self.slot_size - _SLOT.size - _MAX_ENDPOINT
+
+    def _offset(self, slot: int) -> int:
+        return _HEADER.size + slot * self.slot_size
+
+    # region writing
+    def put(
+        self,
+        device_id: int,
+        endpoint: str,
+        entry: EndpointData,
+        interval: float,
+        polled: bool = True,
+    ) -> bool:
+        """
+        Write the data of an endpoint, assigns a slot on first use.
+
+        :param device_id: device of the endpoint.
+        :param endpoint: endpoint name.
+        :param entry: current data of the endpoint.
+        :param interval: poll interval of the endpoint.
+        :param polled: False for endpoints that aren't polled.
+        :return: False if the store is full or the data doesn't fit (the
+            slot is marked as too large then, readers don't get the
+            previous data).
+        """
+        name = endpoint.encode()
+        encoded = entry.encoded or b""
+
+        if len(name) > _MAX_ENDPOINT:
+            debugger.warning(
+                f'shared_store: endpoint name "{endpoint}" of device '
+                f"{device_id} is too long"
+            )
+            return False
+
+        key = (device_id, endpoint)
+        flags = _USED
+        too_large = len(encoded) > self.capacity
+
+        if too_large:
+            encoded = b""
+            flags |= _TOO_LARGE
+
+            if key not in self._too_large:
+                self._too_large.add(key)
+                debugger.warning(
+                    f'shared_store: data of device {device_id} "{endpoint}" '
+                    f"doesn't fit into a slot ({len(entry.encoded)} > "
+                    f"{self.capacity} bytes)"
+                )
+
+        else:
+            self._too_large.discard(key)
+
+            if entry.encoded is not None:
+                flags |= _HAS_DATA
+
+        if entry.stale:
+            flags |= _STALE
+
+        if polled:
+            flags |= _POLLED
+
+        with self._lock:
+            slot = self._slots.get((device_id, endpoint))
+            new_slot = slot is None
+
+            if new_slot:
+                if not self._free:
+                    debugger.warning("shared_store: no free slots left")
+                    return False
+
+                slot = self._free.pop()
+                self._slots[(device_id, endpoint)] = slot
+                self._tombstones.discard(slot)
+
+                if polled:
+                    self._polled.add((device_id, endpoint))
+
+            offset = self._offset(slot)
+            lock = _LOCK.unpack_from(self._map, offset)[0]
+
+            # odd while writing
+            _LOCK.pack_into(self._map, offset, lock + 1)
+
+            _SLOT.pack_into(
+                self._map,
+                offset,
+                lock + 1,
+                entry.seq,
+                device_id,
+                entry.updated_at or 0,
+                -1 if entry.duration is None else entry.duration,
+                interval,
+                len(name),
+                len(encoded),
+                flags,
+                b"" if too_large else (entry.etag or "").encode(),
+            )
+            start = offset + _SLOT.size
+            self._map[start:start + len(name)] = name
+
+            start += _MAX_ENDPOINT
+            self._map[start:start + len(encoded)] = encoded
+
+            _LOCK.pack_into(self._map, offset, lock + 2)
+
+            if entry.seq > self.seq:
+                _LOCK.pack_into(self._map, _SEQ_OFFSET, entry.seq)
+
+            if new_slot:
+                self._bump_generation()
+
+        return not too_large
+
+    def remove(self, device_id: int, seq: int = 0) -> None:
+        """
+        Free all slots of a device, they're kept as tombstones.
+
+        :param device_id: removed device.
+        :param seq: sequence number of the removal.
+        """
+        with self._lock:
+            keys = [key for key in self._slots if key[0] == device_id]
+
+            for key in keys:
+                slot = self._slots.pop(key)
+                self._polled.discard(key)
+                self._too_large.discard(key)
+
+                offset = self._offset(slot)
+                lock = _LOCK.unpack_from(self._map, offset)[0]
+
+                _LOCK.pack_into(self._map, offset, lock + 1)
+                _LOCK.pack_into(self._map, offset + 8, seq)
+                self._map[offset + _FLAGS_OFFSET] = _REMOVED
+                _LOCK.pack_into(self._map, offset, lock + 2)
+
+                # reused last, the tombstone stays visible for a while
+                self._free.insert(0, slot)
+                self._tombstones.add(slot)
+
+            if keys:
+                if seq > self.seq:
+                    _LOCK.pack_into(self._map, _SEQ_OFFSET, seq)
+
+                self._bump_generation()
+
+    def _bump_generation(self) -> None:
+        """Tell readers to rebuild their slot index (lock must be held)."""
+        generation = _LOCK.unpack_from(self._map, _GENERATION_OFFSET)[0]
+        _LOCK.pack_into(self._map, _GENERATION_OFFSET, generation + 1)
+    # endregion
+
+    # region reading
+    def _read_slot(self, slot: int, tombstones: bool = False) -> tuple | None:
+        """
+        Copy a slot, retries while it's being written.
+
+        :param tombstones: also return removed endpoints.
+        :return: (seq, device id, updated at, interval, flags, etag,
+            endpoint, data, duration), None if the slot is unused or
+            couldn't be read.
+        """
+        offset = self._offset(slot)
+
+        for _ in range(self._read_attempts):
+            lock = _LOCK.unpack_from(self._map, offset)[0]
+
+            # being written right now
+            if lock & 1:
+                os.sched_yield()
+                continue
+
+            (
+                _,
+                seq,
+                device_id,
+                updated_at,
+                duration,
+                interval,
+                name_length,
+                data_length,
+                flags,
+                etag,
+            ) = _SLOT.unpack_from(self._map, offset)
+
+            start = offset + _SLOT.size
+            name = self._map[start:start + name_length]
+
+            start += _MAX_ENDPOINT
+            data = self._map[start:start + data_length]
+
+            if _LOCK.unpack_from(self._map, offset)[0] != lock:
+                continue
+
+            if not flags & _USED and not (tombstones and flags & _REMOVED):
+                return None
+
+            return (
+                seq,
+                device_id,
+                updated_at,
+                interval,
+                flags,
+                etag.rstrip(b"\0").decode(),
+                name.decode(),
+                data,
+                None if duration < 0 else duration,
+            )
+
+        debugger.warning(f"shared_store: slot {slot} is stuck being written")
+        return None
+
+    def _index(self) -> dict[tuple[int, str], int]:
+        """
+        (device id, endpoint) -> slot, rebuilt if slots changed.
+        """
+        if self._writable:
+            return self._slots
+
+        generation = _LOCK.unpack_from(self._map, _GENERATION_OFFSET)[0]
+        if generation != self._generation:
+            slots = {}
+            polled = set()
+            tombstones = set()
+            for slot in range(self.n_slots):
+                content = self._read_slot(slot, tombstones=True)
+                if content is None:
+                    continue
+
+                if content[4] & _REMOVED:
+                    tombstones.add(slot)
+                    continue
+
+                key = (content[1], content[6])
+                slots[key] = slot
+
+                if content[4] & _POLLED:
+                    polled.add(key)
+
+            self._slots = slots
+            self._polled = polled
+            self._tombstones = tombstones
+            self._generation = generation
+
+        return self._slots
+
+    def read(
+        self,
+        device_id: int,
+        endpoint: str,
+    ) -> tuple[EndpointData, float, bool, bool] | None:
+        """
+        Read the data of an endpoint.
+
+        :param device_id: device of the endpoint.
+        :param endpoint: endpoint name.
+        :return: data, poll interval, if the endpoint is polled and if its
+            data was too large for the slot (there's no data then), None
+            if the endpoint isn't stored.
+        """
+        for _ in range(2):
+            slot = self._index().get((device_id, endpoint))
+            if slot is None:
+                return None
+
+            content = self._read_slot(slot)
+
+            # slot was reassigned, rebuild the index and try again
+            if content is None or (content[1], content[6]) != (device_id, endpoint):
+                self._generation = -1
+                continue
+
+            seq, _, updated_at, interval, flags, etag, _, data, duration = content
+
+            polled = bool(flags & _POLLED)
+            too_large = bool(flags & _TOO_LARGE)
+
+            if not flags & _HAS_DATA:
+                return EndpointData(seq=seq), interval, polled, too_large
+
+            return _StoredEndpointData(
+                _UNDECODED,
+                data,
+                etag or None,
+                updated_at,
+                seq,
+                stale=bool(flags & _STALE),
+                duration=duration,
+            ), interval, polled, too_large
+
+        return None
+
+    def keys(self, polled: bool = False) -> list[tuple[int, str]]:
+        """
+        Stored (device id, endpoint) pairs.
+
+        :param polled: only the endpoints that are polled.
+        """
+        index = self._index()
+
+        if polled:
+            return [key for key in index if key in self._polled]
+
+        return list(index)
+
+    def changes(self, since: int) -> list[tuple[int, str, int, bytes | None]]:
+        """
+        All endpoints that changed after a sequence number.
+
+        :param since: sequence number of the last known change.
+        :return: (device id, endpoint, seq, encoded data), oldest first.
+            The data of removed endpoints is None (as long as their
+            tombstone wasn't reused), data that was too large is left out.
+        """
+        out = []
+        slots = list(self._index().values()) + list(self._tombstones)
+        for slot in slots:
+            # only copy slots that changed, the writer sets the slots seq
+            # before the stores
+            lock, seq = _LOCK_SEQ.unpack_from(self._map, self._offset(slot))
+            if not lock & 1 and seq <= since:
+                continue
+
+            content = self._read_slot(slot, tombstones=True)
+
+            if content is None or content[0] <= since:
+                continue
+
+            seq, device_id, _, _, flags, _, endpoint, data, _ = content
+            if flags & _REMOVED:
+                out.append((device_id, endpoint, seq, None))
+
+            elif flags & _HAS_DATA:
+                out.append((device_id, endpoint, seq, data))
+
+        out.sort(key=lambda change: change[2])
+        return out
+    # endregion
+
+    def close(self) -> None:
+        self._map.close()
+
+
+class SharedStoreView:
+    """
+    Read only `DeviceBuffer` replacement for `HTTPServer` workers, serves
+    the data another process writes to a `SharedStore`.
+
+    History, health, on demand requests and commands need the polling
+    process and aren't available.
+
+    :cvar _watch_interval: seconds between checks for changes while
+        there are subscribers.
+
+    :ivar _store: store to read.
+    :ivar _subscriptions: subscribers of this process.
+    :ivar _watcher: task publishing changes to the subscribers.
+    """
+
+    # region ClassVars
+    _watch_interval: tp.ClassVar[float] = 0.1
+    # endregion
+
+    # region InstanceVars
+    _store: SharedStore
+    _subscriptions: SubscriptionHub
+    _watcher: asyncio.Task | None
+    # endregion
+
+    def __init__(self, store: SharedStore) -> None:
+        self._store = store
+        self._subscriptions = SubscriptionHub()
+        self._watcher = None
+
+    @property
+    def on_demand(self) -> bool:
+        return False
+
+    @property
+    def epoch(self) -> str:
+        """see `DeviceBuffer.epoch`"""
+        return self._store.epoch
+
+    def get_endpoint_data(self, device_id: int, endpoint: str) -> EndpointData | int:
+        """
+        see `DeviceBuffer.get_endpoint_data`
+
+        :returns: -2 if the data was too large for the store
+        :raises KeyError: if the device isn't stored
+        """
+        stored = self._store.read(device_id, endpoint)
+
+        if stored is None:
+            if not any(did == device_id for did, _ in self._store.keys()):
+                raise KeyError(device_id)
+
+            return -1
+
+        if stored[3]:
+            return -2
+
+        return stored[0]
+
+    def get_device_data(
+        self,
+        device_id: int,
+        endpoint: str,
+        encoded: bool = False,
+    ) -> dict | bytes | int | EllipsisType:
+        """
+        see `DeviceBuffer.get_device_data`, -2 if the data was too large
+        for the store
+        """
+        entry = self.get_endpoint_data(device_id, endpoint)
+
+        if isinstance(entry, int):
+            return entry
+
+        if encoded:
+            return ... if entry.encoded is None else entry.encoded
+
+        return entry.data
+
+    async def fetch_device_data(
+        self,
+        device_id: int,
+        endpoint: str,
+    ) -> EndpointData | int:
+        """no on demand requests, returns the stored data (or -2)"""
+        return self.get_endpoint_data(device_id, endpoint)
+
+    def get_batch_data(
+        self,
+        requested: tp.Iterable[tuple[int | None, str | None]],
+    ) -> list[tuple[dict, bytes | None]]:
+        """see `DeviceBuffer.get_batch_data`"""
+        # device id -> polled endpoints
+        devices: dict[int, list[str]] = {}
+        for did, ep in self._store.keys():
+            devices.setdefault(did, [])
+
+        for did, ep in self._store.keys(polled=True):
+            devices[did].append(ep)
+
+        out = []
+        for device_id, endpoint in requested:
+            if device_id is None:
+                device_ids = list(devices)
+
+            else:
+                device_ids = [device_id]
+
+            for did in device_ids:
+                if did not in devices:
+                    out.append(({
+                        "device_id": did,
+                        "endpoint": endpoint,
+                        "status": "not_found",
+                        "age": None,
+                        "etag": None,
+                        "stale": False,
+                        "fetched_at": None,
+                        "fetch_started": None,
+                        "fetch_duration": None,
+                    }, None))
+                    continue
+
+                if endpoint is None:
+                    endpoints = devices[did]
+
+                else:
+                    endpoints = [endpoint]
+
+                for ep in endpoints:
+                    stored = self._store.read(did, ep)
+
+                    if stored is None:
+                        entry = EndpointData()
+                        status = "not_found"
+
+                    elif stored[3]:
+                        entry = stored[0]
+                        status = "too_large"
+
+                    else:
+                        entry = stored[0]
+                        status = "no_data" if entry.encoded is None else "ok"
+
+                    out.append(({
+                        "device_id": did,
+                        "endpoint": ep,
+                        "status": status,
+                        "age": self._age(entry),
+                        "etag": entry.etag,
+                        "stale": entry.stale,
+                        "fetched_at": entry.updated_at,
+                        "fetch_started": entry.started_at,
+                        "fetch_duration": entry.duration,
+                    }, entry.encoded))
+
+        return out
+
+    def get_changes(
+        self,
+        since: int,
+    ) -> tuple[int, list[tuple[dict, bytes | None]]]:
+        """see `DeviceBuffer.get_changes`"""
+        seq = self._store.seq
+
+        if since > seq:
+            since = 0
+
+        out = []
+        for did, ep, ep_seq, data in self._store.changes(since):
+            if ep_seq > seq:
+                continue
+
+            item = {"device_id": did, "endpoint": ep, "seq": ep_seq}
+            if data is None:
+                item["removed"] = True
+
+            out.append((item, data))
+
+        return seq, out
+
+    def get_device_history(self, *_, **__) -> int:
+        """not available, always -1"""
+        return -1
+
+    def get_poll_interval(self, device_id: int, endpoint: str) -> float:
+        """see `DeviceBuffer.get_poll_interval`"""
+        stored = self._store.read(device_id, endpoint)
+        return 0 if stored is None else stored[1]
+
+    def get_data_age(self, device_id: int, endpoint: str) -> float | None:
+        """see `DeviceBuffer.get_data_age`"""
+        stored = self._store.read(device_id, endpoint)
+        return None if stored is None else self._age(stored[0])
+
+    @staticmethod
+    def _age(entry: EndpointData) -> float | None:
+        if entry.updated_at is None:
+            return None
+
+        return max(time.time() - entry.updated_at, 0)
+
+    def subscribe(
+        self,
+        topics: tp.Iterable[Topic],
+        max_queue: int = 64,
+    ) -> Subscription:
+        """
+        see `DeviceBuffer.subscribe`, changes are picked up every
+        `_watch_interval` seconds
+        """
+        subscription = self._subscriptions.subscribe(topics, max_queue)
+
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.unsubscribe(subscription)
+
+    async def _watch(self) -> None:
+        """
+        publish the stores changes while there are subscribers
+        """
+        seq = self._store.seq
+
+        while self._subscriptions:
+            await asyncio.sleep(self._watch_interval)
+
+            seq, changes = self.get_changes(seq)
+            for item, data in changes:
+                # removals aren't streamed
+                if data is None:
+                    continue
+
+                head = json.dumps(
+                    {
+                        "device_id": item["device_id"],
+                        "endpoint": item["endpoint"],
+                        "time": time.time(),
+                    },
+                    separators=(",", ":"),
+                ).encode()
+                self._subscriptions.publish(
+                    item["device_id"],
+                    item["endpoint"],
+                    head[:-1] + b',"data":' + data + b"}",
+                )
+
+    def write_metrics(self, writer: MetricsWriter) -> None:
+        """
+        add the data ages to a metrics page, the poller metrics are only
+        available from the polling process
+        """
+        for device_id, endpoint in self._store.keys(polled=True):
+            age = self.get_data_age(device_id, endpoint)
+
+            if age is not None:
+                writer.gauge(
+                    "iot_data_age_seconds",
+                    age,
+                    "seconds since the buffered data was received",
+                    device=device_id,
+                    endpoint=endpoint,
+                )
+
+    async def send_command(self, *_, **__) -> int:
+        """not available, always -2"""
+        return -2
+
+    def get_staleness(self, *_, **__) -> int:
+        """not available, always -1"""
+        return -1
+
+    def get_device_health(self, device_id: int) -> int:
+        """not available, always -1"""
+        return -1
+
+    def get_health(self) -> dict[int, dict]:
+        """not available, always empty"""
+        return {}
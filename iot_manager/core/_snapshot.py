@@ -0,0 +1,127 @@
+"""
+Compact on-disk snapshot of buffered device data.
+
+| ``Path``: iot_manager/core/_snapshot.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+
+File layout (little endian)::
+
+    header   magic (8 bytes), number of records (uint32)
+    records  device id (int64), updated at (float64),
+             endpoint offset, endpoint length,
+             data offset, data length (uint32 each)
+    blobs    utf-8 endpoint names and json encoded payloads
+
+All offsets are absolute, so a record can be read straight from a
+memory map without parsing the rest of the file.
+"""
+
+import mmap
+import os
+import struct
+import typing as tp
+
+_MAGIC = b"IOTSNAP1"
+_HEADER = struct.Struct("<8sI")
+_RECORD = struct.Struct("<qdIIII")
+
+
+class SnapshotRecord(tp.NamedTuple):
+    device_id: int
+    endpoint: str
+    updated_at: float  # unix time
+    encoded: bytes  # json encoded payload
+
+
+def write_snapshot(path: str, records: tp.Iterable[SnapshotRecord]) -> int:
+    """
+    Write records to a snapshot file.
+
+    The file is written next to `path` first and then moved into place, so
+    readers only ever see a complete snapshot.
+
+    :param path: snapshot file.
+    :param records: records to write.
+    :return: number of written records.
+    """
+    records = list(records)
+    names = [r.endpoint.encode() for r in records]
+
+    # blobs start right after the record table
+    offset = _HEADER.size + _RECORD.size * len(records)
+
+    table = bytearray(_HEADER.pack(_MAGIC, len(records)))
+    for record, name in zip(records, names):
+        table += _RECORD.pack(
+            record.device_id,
+            record.updated_at,
+            offset,
+            len(name),
+            offset + len(name),
+            len(record.encoded),
+        )
+        offset += len(name) + len(record.encoded)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(table)
+
+        for record, name in zip(records, names):
+            file.write(name)
+            file.write(record.encoded)
+
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def read_snapshot(path: str) -> list[SnapshotRecord]:
+    """
+    Read all records of a snapshot file.
+
+    :param path: snapshot file.
+    :return: stored records, empty if the file is empty.
+    :raises ValueError: if the file isn't a valid snapshot.
+    """
+    with open(path, "rb") as file:
+        # empty files can't be mapped
+        if os.fstat(file.fileno()).st_size == 0:
+            return []
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if len(data) < _HEADER.size:
+                raise ValueError("truncated snapshot header")
+
+            magic, count = _HEADER.unpack_from(data, 0)
+            if magic != _MAGIC:
+                raise ValueError("not a snapshot file")
+
+            if len(data) < _HEADER.size + count * _RECORD.size:
+                raise ValueError("truncated snapshot records")
+
+            out = []
+            for i in range(count):
+                (
+                    device_id,
+                    updated_at,
+                    name_offset,
+                    name_length,
+                    data_offset,
+                    data_length,
+                ) = _RECORD.unpack_from(data, _HEADER.size + i * _RECORD.size)
+
+                if data_offset + data_length > len(data):
+                    raise ValueError("truncated snapshot data")
+
+                out.append(SnapshotRecord(
+                    device_id,
+                    data[name_offset:name_offset + name_length].decode(),
+                    updated_at,
+                    data[data_offset:data_offset + data_length],
+                ))
+
+            return out
@@ -0,0 +1,164 @@
+"""
+Push updates of buffered data to subscribers.
+
+| ``Path``: iot_manager/core/_subscriptions.py
+| ``Project``: IOTManager
+| ``Created``: 17.10.2026
+| ``Authors``: Nilusink
+"""
+
+import asyncio
+import threading
+import typing as tp
+from collections import deque
+
+# (device id, endpoint), None matches all devices / endpoints
+type Topic = tuple[int | None, str | None]
+
+
+class Subscription:
+    """
+    Bounded message queue of a single subscriber.
+
+    Publishing never blocks: once the queue is full the oldest message is
+    dropped. The subscriber is woken on its own event loop.
+
+    :ivar topics: topics this subscription receives.
+    :ivar dropped: messages dropped since the last `get`.
+    :ivar _queue: pending messages.
+    :ivar _loop: loop of the subscriber.
+    :ivar _event: set if messages are pending.
+    """
+
+    # region InstanceVars
+    topics: frozenset[Topic]
+    dropped: int
+    _queue: deque[bytes]
+    _loop: asyncio.AbstractEventLoop
+    _event: asyncio.Event
+    # endregion
+
+    def __init__(self, topics: tp.Iterable[Topic], max_queue: int) -> None:
+        self.topics = frozenset(topics)
+        self.dropped = 0
+        self._queue = deque(maxlen=max_queue)
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def put(self, message: bytes) -> None:
+        """
+        Queue a message, may be called from any thread.
+
+        :param message: encoded message.
+        """
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+
+        self._queue.append(message)
+
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+
+        except RuntimeError:
+            # subscribers loop already closed
+            pass
+
+    async def get(self, timeout: float | None = None) -> list[bytes]:
+        """
+        Wait for messages.
+
+        :param timeout: max. seconds to wait.
+        :return: all pending messages, empty on timeout.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+
+        except TimeoutError:
+            return []
+
+        self._event.clear()
+
+        out = []
+        while self._queue:
+            out.append(self._queue.popleft())
+
+        return out
+
+
+class SubscriptionHub:
+    """
+    Fans out published messages to matching subscriptions.
+
+    :ivar _by_topic: topic -> subscriptions.
+    :ivar _lock: guards ``_by_topic``.
+    """
+
+    # region InstanceVars
+    _by_topic: dict[Topic, set[Subscription]]
+    _lock: threading.Lock
+    # endregion
+
+    def __init__(self) -> None:
+        self._by_topic = {}
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self._by_topic)
+
+    def subscribe(
+        self,
+        topics: tp.Iterable[Topic],
+        max_queue: int = 64,
+    ) -> Subscription:
+        """
+        Create a new subscription, must be called from the subscribers loop.
+
+        :param topics: (device id, endpoint) pairs, None matches all.
+        :param max_queue: max. pending messages before dropping.
+        :return: the new subscription.
+        """
+        subscription = Subscription(topics, max_queue)
+
+        with self._lock:
+            for topic in subscription.topics:
+                self._by_topic.setdefault(topic, set()).add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Remove a subscription.
+
+        :param subscription: subscription to remove.
+        """
+        with self._lock:
+            for topic in subscription.topics:
+                subscriptions = self._by_topic.get(topic)
+                if subscriptions is None:
+                    continue
+
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    self._by_topic.pop(topic)
+
+    def publish(self, device_id: int, endpoint: str, message: bytes) -> None:
+        """
+        Send a message to every matching subscription.
+
+        :param device_id: device the message is about.
+        :param endpoint: endpoint the message is about.
+        :param message: encoded message.
+        """
+        matching: set[Subscription] = set()
+
+        with self._lock:
+            for topic in (
+                (device_id, endpoint),
+                (device_id, None),
+                (None, endpoint),
+                (None, None),
+            ):
+                matching.update(self._by_topic.get(topic, ()))
+
+        for subscription in matching:
+            subscription.put(message)
@@ -4,4 +4,6 @@ initial code form FridrichDerGosse/3D-Drone-Tracking
 from ._console_colors import CC, get_fg_color
 from ._debugger import DebugLevel, debugger
 from ._decoators import run_with_debug
+from ._json_log import JsonLogReader
+from ._profiling import profiler
 from ._utils import get_caller_name, print_ic_style
@@ -7,12 +7,19 @@ Debugs stuff (fancy, right?)
 Author:
 Nilusink
 """
+import atexit
+import json
+import os
+import time
+import typing as tp
 from enum import IntEnum
+from functools import partial
 from os import PathLike
 
 from icecream import ic
 
 from ._console_colors import CC, get_fg_color
+from ._log_writer import LogWriter
 from ._utils import print_ic_style
 
 
@@ -24,7 +31,62 @@ class DebugLevel(IntEnum):
     trace = 4
 
 
+# a string, or a function creating it (only called if the level is enabled)
+type Message = str | tp.Callable[[], str]
+
+
+def _format(message: Message, args: tuple) -> str:
+    """
+    build the message text, `args` are %-formatted into it (like `logging`)
+    """
+    if callable(message):
+        message = message()
+
+    if not isinstance(message, str):
+        message = repr(message)
+
+    if args:
+        message = message % args
+
+    return message
+
+
+def _child_path(path: PathLike, name: str) -> str:
+    """
+    "IOTManager.log" -> "IOTManager.<name>.log"
+    """
+    root, ext = os.path.splitext(os.fspath(path))
+    return f"{root}.{name}{ext}"
+
+
+def _split_subsystem(text: str) -> tuple[str | None, str]:
+    """
+    split "dev_buf: message" into its subsystem and the message
+    """
+    subsystem, sep, rest = text.partition(": ")
+    if sep and subsystem.isidentifier():
+        return subsystem, rest
+
+    return None, text
+
+
 class _Debugger:
+    """
+    call sites pass a format string and its arguments (or a function) so
+    nothing is formatted unless the level is enabled. to skip building
+    the arguments too, check the levels flag first::
+
+        if debugger.trace_enabled:
+            debugger.trace("dev_buf: got %s", expensive())
+
+    keyword arguments of the level methods are structured fields, they
+    only end up in the json log (see `init`)::
+
+        debugger.log("dev_buf: timeout", device_id=1, endpoint="weather")
+
+    :ivar trace_enabled: if trace messages are output (same for the other
+        levels), updated when the level changes
+    """
     _debug_colors: dict[str, str] = {
         "error": CC.fg.RED,
         "warning": CC.fg.YELLOW,
@@ -38,6 +100,16 @@ class _Debugger:
         self._print_debug = ...
         self._write_debug = ...
         self._debug_level = ...
+        self._writer_settings = None
+        self._writer: LogWriter | None = None
+        self._json_file = None
+        self._json_writer: LogWriter | None = None
+
+        self.error_enabled = False
+        self.warning_enabled = False
+        self.info_enabled = False
+        self.log_enabled = False
+        self.trace_enabled = False
 
         # # fancy stuff
         # for debug_level in self._debug_colors:
@@ -64,67 +136,166 @@ class _Debugger:
             print_debug: bool = True,
             write_debug: bool = True,
             debug_level: DebugLevel = DebugLevel.warning,
+            background: bool = False,
+            max_queue: int = 10_000,
+            max_file_size: int | None = None,
+            backups: int = 3,
+            json_file: PathLike | None = None,
     ) -> None:
+        """
+        :param log_file: file to write to
+        :param print_debug: print messages to the terminal
+        :param write_debug: write messages to `log_file`
+        :param debug_level: max. level to output
+        :param background: print and write from a background thread, see
+            `LogWriter` (call `close` before exiting, also done at exit)
+        :param max_queue: max. messages waiting for the background writer
+        :param max_file_size: rotate the log file at this size (bytes),
+            background only. child processes get their own files then,
+            see `child_settings`
+        :param backups: number of rotated log files to keep
+        :param json_file: also write every message as a json line with its
+            time, level, subsystem and fields (see `JsonLogReader`),
+            rotated like `log_file`
+        """
         self._log_file = log_file
         self._print_debug = print_debug
         self._write_debug = write_debug
-        self._debug_level = debug_level
+        self.debug_level = debug_level
+
+        # re-initialized, finish the old file first
+        self.close()
+
+        self._json_file = json_file
+
+        self._writer_settings = None
+        if background:
+            self._writer_settings = {
+                "max_queue": max_queue,
+                "max_file_size": max_file_size,
+                "backups": backups,
+            }
+            self._writer = LogWriter(
+                log_file if write_debug else None,
+                max_queue=max_queue,
+                max_bytes=max_file_size,
+                backups=backups,
+            )
+
+            if json_file is not None:
+                self._json_writer = LogWriter(
+                    json_file,
+                    max_queue=max_queue,
+                    max_bytes=max_file_size,
+                    backups=backups,
+                )
+
+            atexit.register(self.close)
 
     @property
     def debug_level(self) -> DebugLevel:
         return self._debug_level
 
-    def trace(self, *args) -> None:
+    @debug_level.setter
+    def debug_level(self, value: DebugLevel) -> None:
+        self._debug_level = value
+
+        self.error_enabled = value >= DebugLevel.error
+        self.warning_enabled = value >= DebugLevel.warning
+        self.info_enabled = value >= DebugLevel.info
+        self.log_enabled = value >= DebugLevel.log
+        self.trace_enabled = value >= DebugLevel.trace
+
+    @property
+    def settings(self) -> dict:
+        """
+        current settings, as keyword arguments for `init`
+        """
+        return {
+            "log_file": self._log_file,
+            "print_debug": self._print_debug,
+            "write_debug": self._write_debug,
+            "debug_level": self._debug_level,
+            "background": self._writer_settings is not None,
+            **(self._writer_settings or {}),
+            "json_file": self._json_file,
+        }
+
+    def child_settings(self, name: str) -> dict:
+        """
+        settings for `init` in a child process. every process rotates its
+        files on its own, so with rotation each child writes to its own
+        ones ("IOTManager.log" -> "IOTManager.<name>.log")
+
+        :param name: unique name of the child
+        """
+        settings = self.settings
+        if settings.get("max_file_size") is None:
+            return settings
+
+        settings["log_file"] = _child_path(self._log_file, name)
+        if self._json_file is not None:
+            settings["json_file"] = _child_path(self._json_file, name)
+
+        return settings
+
+    def trace(self, message: Message, *args, **fields) -> None:
         """
         level: trace
         """
-        if self._debug_level >= DebugLevel.trace:
-            self._write(*args, color=self._debug_colors["trace"])
+        if self.trace_enabled:
+            self._write("trace", _format(message, args), fields)
 
-    def info(self, *args) -> None:
+    def info(self, message: Message, *args, **fields) -> None:
         """
         level: info
         """
-        if self._debug_level >= DebugLevel.info:
-            self._write(*args, color=self._debug_colors["info"])
+        if self.info_enabled:
+            self._write("info", _format(message, args), fields)
 
-    def log(self, *args) -> None:
+    def log(self, message: Message, *args, **fields) -> None:
         """
         level: log
         """
-        if self._debug_level >= DebugLevel.log:
-            self._write(*args, color=self._debug_colors["log"])
+        if self.log_enabled:
+            self._write("log", _format(message, args), fields)
 
-    def warning(self, *args) -> None:
+    def warning(self, message: Message, *args, **fields) -> None:
         """
         level: warning
         """
-        if self._debug_level >= DebugLevel.warning:
-            self._write(*args, color=self._debug_colors["warning"])
+        if self.warning_enabled:
+            self._write("warning", _format(message, args), fields)
 
-    def error(self, *args) -> None:
+    def error(self, message: Message, *args, **fields) -> None:
         """
         level: error
         """
-        if self._debug_level >= DebugLevel.error:
-            self._write(*args, color=self._debug_colors["error"])
+        if self.error_enabled:
+            self._write("error", _format(message, args), fields)
 
-    def _write(self, *args, color: str = CC.ctrl.ENDC) -> None:
+    def _write(self, level: str, string_out: str, fields: dict) -> None:
         """
         actually writes / prints
         """
-        prefix = ic.prefix()
-        string_out = ""
-
-        for arg in args:
-            if isinstance(arg, str):
-                string_out += arg
+        if self._json_file is not None:
+            self._write_json(level, string_out, fields)
 
-            elif hasattr(arg, "__repr__"):
-                string_out += arg.__repr__()
+        color = self._debug_colors[level]
+        prefix = ic.prefix()
 
-            else:
-                string_out += str(arg)
+        if self._writer is not None:
+            self._writer.put(
+                prefix + string_out + "\n" if self._write_debug else None,
+                partial(
+                    print_ic_style,
+                    color,
+                    string_out,
+                    CC.ctrl.ENDC,
+                    prefix=prefix,
+                ) if self._print_debug else None,
+            )
+            return
 
         # print to terminal
         if self._print_debug:
@@ -135,5 +306,46 @@ class _Debugger:
             with open(self._log_file, "a") as out:
                 out.write(prefix + string_out + "\n")
 
+    def _write_json(self, level: str, string_out: str, fields: dict) -> None:
+        """
+        write a message to the json log
+        """
+        subsystem = fields.pop("subsystem", None)
+        if subsystem is None:
+            subsystem, string_out = _split_subsystem(string_out)
+
+        record = {
+            "ts": time.time(),
+            "level": level,
+            "subsystem": subsystem,
+            "msg": string_out,
+        }
+        for key, value in fields.items():
+            record.setdefault(key, value)
+
+        # e.g. ip addresses
+        line = json.dumps(record, separators=(",", ":"), default=str) + "\n"
+
+        if self._json_writer is not None:
+            self._json_writer.put(line)
+            return
+
+        with open(self._json_file, "a") as out:
+            out.write(line)
+
+    def close(self) -> None:
+        """
+        write all messages queued for the background writers and stop them
+        """
+        writers = (self._writer, self._json_writer)
+        self._writer = None
+        self._json_writer = None
+
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+
+        atexit.unregister(self.close)
+
 
 debugger = _Debugger()
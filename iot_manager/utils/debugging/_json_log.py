@@ -0,0 +1,321 @@
+"""
+_json_log.py
+17. October 2026
+
+reads json logs written by the debugger, using a sidecar index
+
+Author:
+Nilusink
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import typing as tp
+import zlib
+from os import PathLike
+
+# index file layout (little endian):
+#   header   magic, indexed log size, number of records, crc32 of the
+#            start of the log (detects rotated / replaced logs)
+#   records  time, max. time of all records so far, device id (-1 if
+#            none), offset and length of the line in the log
+_MAGIC = b"IOTLIDX1"
+_HEADER = struct.Struct("<8sQQI")
+_RECORD = struct.Struct("<ddqQI")
+_NO_DEVICE = -1
+
+# bytes of the log that identify it
+_ID_SIZE = 256
+
+
+class _MaxTimes:
+    """
+    "max. time so far" column of the index, as a sequence for `bisect`
+    """
+
+    def __init__(self, data: mmap.mmap, count: int) -> None:
+        self._data = data
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> float:
+        return _RECORD.unpack_from(self._data, _HEADER.size + i * _RECORD.size)[1]
+
+
+class _LogIndex:
+    """
+    index of a single log file, see `JsonLogReader`
+    """
+
+    def __init__(self, path: str, slack: float) -> None:
+        self._path = path
+        self._index_path = f"{path}.idx"
+        self._slack = slack
+
+    @staticmethod
+    def _log_id(data: mmap.mmap | bytes) -> int:
+        return zlib.crc32(data[:_ID_SIZE])
+
+    def update_index(self, previous: str | None = None) -> int:
+        """
+        index all lines written since the last update
+
+        :param previous: path the log had before it was rotated, its
+            index is taken over if it belongs to this log
+        :returns: number of newly indexed lines
+        """
+        with open(self._path, "rb") as log:
+            size = os.fstat(log.fileno()).st_size
+
+            # empty files can't be mapped
+            if size == 0:
+                return 0
+
+            with mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if previous is not None:
+                    self._adopt_index(f"{previous}.idx", data, size)
+
+                return self._update_index(data, size)
+
+    def _adopt_index(self, index_path: str, data: mmap.mmap, size: int) -> None:
+        """
+        take over the index of a rotated log, so it's not indexed again
+        """
+        try:
+            with open(index_path, "rb") as index:
+                header = index.read(_HEADER.size)
+
+        except FileNotFoundError:
+            return
+
+        if len(header) != _HEADER.size:
+            return
+
+        magic, indexed, _, indexed_id = _HEADER.unpack(header)
+        if (
+                magic == _MAGIC
+                and _ID_SIZE <= indexed <= size
+                and indexed_id == self._log_id(data)
+        ):
+            os.replace(index_path, self._index_path)
+
+    def _update_index(self, data: mmap.mmap, size: int) -> int:
+        log_id = self._log_id(data)
+        indexed, count, max_ts = 0, 0, float("-inf")
+
+        mode = "r+b" if os.path.exists(self._index_path) else "w+b"
+        with open(self._index_path, mode) as index:
+            header = index.read(_HEADER.size)
+
+            if len(header) == _HEADER.size:
+                magic, indexed, count, indexed_id = _HEADER.unpack(header)
+
+                # different log or shrunk, start over
+                if (
+                        magic != _MAGIC
+                        or indexed > size
+                        or (indexed >= _ID_SIZE and indexed_id != log_id)
+                ):
+                    indexed, count = 0, 0
+
+            else:
+                indexed, count = 0, 0
+
+            if indexed == size:
+                return 0
+
+            if count:
+                index.seek(_HEADER.size + (count - 1) * _RECORD.size)
+                max_ts = _RECORD.unpack(index.read(_RECORD.size))[1]
+
+            # records of an interrupted update aren't in the header count
+            index.truncate(_HEADER.size + count * _RECORD.size)
+            index.seek(_HEADER.size + count * _RECORD.size)
+
+            records = bytearray()
+            offset = indexed
+            new = 0
+            while offset < size:
+                end = data.find(b"\n", offset, size)
+
+                # last line is still being written
+                if end == -1:
+                    break
+
+                ts, device_id = self._parse_key(data[offset:end])
+                if ts is not None:
+                    max_ts = max(max_ts, ts)
+                    records += _RECORD.pack(
+                        ts,
+                        max_ts,
+                        device_id,
+                        offset,
+                        end - offset,
+                    )
+                    new += 1
+
+                offset = end + 1
+
+            index.write(records)
+            index.seek(0)
+            index.write(_HEADER.pack(_MAGIC, offset, count + new, log_id))
+
+        return new
+
+    @staticmethod
+    def _parse_key(line: bytes) -> tuple[float | None, int]:
+        """
+        :returns: time (None if the line isn't valid) and device id
+        """
+        try:
+            record = json.loads(line)
+            ts = float(record["ts"])
+
+        except (ValueError, KeyError, TypeError):
+            return None, _NO_DEVICE
+
+        device_id = record.get("device_id")
+        if not isinstance(device_id, int):
+            device_id = _NO_DEVICE
+
+        return ts, device_id
+
+    def query(
+            self,
+            start: float | None,
+            end: float | None,
+            device_id: int | None,
+    ) -> tp.Iterator[dict]:
+        """
+        see `JsonLogReader.query`, the index has to be up to date
+        """
+        if not os.path.exists(self._index_path):
+            return
+
+        with (
+            open(self._path, "rb") as log,
+            open(self._index_path, "rb") as index,
+        ):
+            if os.fstat(log.fileno()).st_size == 0:
+                return
+
+            with (
+                mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as data,
+                mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ) as idx,
+            ):
+                count = _HEADER.unpack_from(idx, 0)[2]
+                max_times = _MaxTimes(idx, count)
+
+                # every line before the first one reaching `start` is older
+                first = 0
+                if start is not None:
+                    first = bisect.bisect_left(max_times, start)
+
+                last = count
+                if end is not None:
+                    last = bisect.bisect_right(max_times, end + self._slack)
+
+                for i in range(first, last):
+                    ts, _max_ts, line_device, offset, length = (
+                        _RECORD.unpack_from(idx, _HEADER.size + i * _RECORD.size)
+                    )
+
+                    if start is not None and ts < start:
+                        continue
+
+                    if end is not None and ts > end:
+                        continue
+
+                    if device_id is not None and line_device != device_id:
+                        continue
+
+                    yield json.loads(data[offset:offset + length])
+
+
+class JsonLogReader:
+    """
+    Queries a json log (see `debugger.init`) by time and device without
+    parsing all of it.
+
+    Every file has an index next to it (``<log>.idx``) with a fixed size
+    record per line, so a query only parses the lines it returns. New
+    lines are indexed on every query. Rotated files (``<log>.1`` and so
+    on) are queried too, their index moves with them.
+
+    Lines are found by time using the running max. time of the log, so
+    lines written out of order (e.g. by another process) are only found
+    if they're at most `slack` seconds late.
+    """
+
+    def __init__(self, path: PathLike | str, slack: float = 5) -> None:
+        """
+        :param path: json log file
+        :param slack: max. seconds a line may be older than the ones
+            written before it
+        """
+        self._path = os.fspath(path)
+        self._slack = slack
+
+    def _files(self) -> list[str]:
+        """
+        the log and its rotated files, oldest first
+        """
+        files = [self._path]
+        while os.path.exists(f"{self._path}.{len(files)}"):
+            files.append(f"{self._path}.{len(files)}")
+
+        return files[::-1]
+
+    def update_index(self) -> int:
+        """
+        index all lines written since the last update
+
+        :returns: number of newly indexed lines
+        """
+        files = self._files()
+
+        new = 0
+        for i, path in enumerate(files):
+            # rotated, it had the name of the next newer file before
+            previous = files[i + 1] if i + 1 < len(files) else None
+
+            try:
+                new += _LogIndex(path, self._slack).update_index(previous)
+
+            except FileNotFoundError:
+                # rotated while updating, found on the next update
+                pass
+
+        return new
+
+    def query(
+            self,
+            start: float | None = None,
+            end: float | None = None,
+            device_id: int | None = None,
+    ) -> tp.Iterator[dict]:
+        """
+        get the lines of a time range and / or device, in log order
+
+        :param start: unix time, from the start of the log if None
+        :param end: unix time (inclusive), to the end of the log if None
+        :param device_id: only lines with this `device_id` field
+        :returns: the parsed lines
+        """
+        self.update_index()
+
+        for path in self._files():
+            try:
+                yield from _LogIndex(path, self._slack).query(
+                    start,
+                    end,
+                    device_id,
+                )
+
+            except FileNotFoundError:
+                # rotated away since the update
+                pass
@@ -0,0 +1,229 @@
+"""
+_log_writer.py
+17. October 2026
+
+writes log lines from a background thread
+
+Author:
+Nilusink
+"""
+import os
+import queue
+import sys
+import threading
+import typing as tp
+from os import PathLike
+from time import monotonic
+
+
+class LogWriter:
+    """
+    Log lines are put on a bounded queue and written by a background
+    thread, so logging never waits for the disk (or terminal).
+
+    The file stays open and is flushed once `flush_size` bytes are
+    pending or `flush_interval` seconds passed. If the queue is full,
+    lines are dropped and a notice is written instead. `close` writes
+    everything that's still queued.
+
+    Rotation: once the file would grow past `max_bytes`, it's renamed to
+    ``<path>.1`` (``.1`` to ``.2`` and so on, up to `backups` files)
+    and a new one is started. Each process rotates on its own, so
+    processes sharing a file shouldn't use rotation.
+    """
+
+    def __init__(
+            self,
+            path: PathLike | str | None,
+            max_queue: int = 10_000,
+            flush_size: int = 64 * 1024,
+            flush_interval: float = 1,
+            max_bytes: int | None = None,
+            backups: int = 3,
+    ) -> None:
+        """
+        :param path: log file, only console output if None
+        :param max_queue: max. number of queued lines
+        :param flush_size: pending bytes before the file is flushed
+        :param flush_interval: max. seconds between flushes
+        :param max_bytes: file size to rotate at, never rotates if None
+        :param backups: number of rotated files to keep
+        """
+        self._path = path
+        self._flush_size = flush_size
+        self._flush_interval = flush_interval
+        self._max_bytes = max_bytes
+        self._backups = backups
+
+        self._queue: queue.Queue[
+            tuple[str | None, tp.Callable[[], None] | None] | None
+        ] = queue.Queue(max_queue)
+
+        self.dropped = 0
+        self._reported_drops = 0
+
+        self._file: tp.BinaryIO | None = None
+        self._size = 0
+        self._pending = 0
+        self._last_flush = monotonic()
+
+        if path is not None:
+            self._open()
+
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name="iot_manager_log_writer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def put(
+            self,
+            line: str | None,
+            echo: tp.Callable[[], None] | None = None,
+    ) -> bool:
+        """
+        queue a line, never blocks
+
+        :param line: written to the file (including the newline)
+        :param echo: called on the writer thread, e.g. to print the line
+        :returns: False if the queue was full and the line was dropped
+        """
+        try:
+            self._queue.put_nowait((line, echo))
+
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+        return True
+
+    def close(self) -> None:
+        """
+        write all queued lines and stop the writer
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+
+        # blocking, the sentinel must not be dropped
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        """
+        background thread, writes the queued lines
+        """
+        running = True
+        while running:
+            try:
+                items = [self._queue.get(timeout=self._flush_interval)]
+
+            except queue.Empty:
+                items = []
+
+            # take everything that's queued, one write per batch
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+
+                except queue.Empty:
+                    break
+
+            # written in chunks of `flush_size`, so a big backlog can't
+            # overshoot the rotation size by much
+            chunk = bytearray()
+            for item in items:
+                if item is None:
+                    running = False
+                    continue
+
+                line, echo = item
+                if line is not None:
+                    chunk += line.encode()
+
+                    if len(chunk) >= self._flush_size:
+                        self._write(chunk)
+                        chunk.clear()
+
+                if echo is not None:
+                    echo()
+
+            dropped = self.dropped
+            if dropped != self._reported_drops:
+                chunk += (
+                    f"log writer: dropped {dropped - self._reported_drops} "
+                    f"messages, queue was full\n"
+                ).encode()
+                self._reported_drops = dropped
+
+            self._write(chunk)
+
+            if (
+                    not running
+                    or self._pending >= self._flush_size
+                    or monotonic() - self._last_flush >= self._flush_interval
+            ):
+                self._flush()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self) -> None:
+        self._file = open(self._path, "ab")
+        self._size = self._file.tell()
+
+    def _write(self, data: bytes | bytearray) -> None:
+        if self._file is None or not data:
+            return
+
+        try:
+            if (
+                    self._max_bytes is not None
+                    and self._size
+                    and self._size + len(data) > self._max_bytes
+            ):
+                self._rotate()
+
+            self._file.write(data)
+            self._size += len(data)
+            self._pending += len(data)
+
+        except (OSError, ValueError) as e:
+            # nowhere else to log it to (ValueError: file closed after a
+            # failed rotation)
+            print(f"log writer: failed to write log: {e}", file=sys.stderr)
+
+    def _flush(self) -> None:
+        if self._file is not None and self._pending:
+            try:
+                self._file.flush()
+
+            except (OSError, ValueError) as e:
+                print(f"log writer: failed to flush log: {e}", file=sys.stderr)
+
+        self._pending = 0
+        self._last_flush = monotonic()
+
+    def _rotate(self) -> None:
+        """
+        move the current file to ``.1`` and start a new one
+        """
+        self._file.close()
+
+        if self._backups > 0:
+            for i in range(self._backups - 1, 0, -1):
+                source = f"{self._path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self._path}.{i + 1}")
+
+            os.replace(self._path, f"{self._path}.1")
+
+        else:
+            os.remove(self._path)
+
+        self._open()
+        self._pending = 0
@@ -0,0 +1,154 @@
+"""
+_profiling.py
+17. October 2026
+
+cheap timing spans for hot paths
+
+Author:
+Nilusink
+"""
+import functools
+import inspect
+import typing as tp
+from time import perf_counter_ns
+
+
+class _Span:
+    """
+    aggregated timings of a single function
+
+    updated without a lock, under the GIL two threads finishing at the
+    same time can very rarely lose a call, which is fine for profiling
+    """
+    __slots__ = ("name", "calls", "total_ns", "min_ns", "max_ns")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.total_ns = 0
+        self.min_ns = 0
+        self.max_ns = 0
+
+    def add(self, duration_ns: int) -> None:
+        """
+        record a single call
+        """
+        if not self.calls or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+        self.calls += 1
+        self.total_ns += duration_ns
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_ns": self.total_ns,
+            "mean_ns": self.total_ns // self.calls if self.calls else None,
+            "min_ns": self.min_ns if self.calls else None,
+            "max_ns": self.max_ns if self.calls else None,
+        }
+
+
+class _Profiler:
+    """
+    collects the timings of all functions decorated with `span`
+
+    the aggregate of a function is created when it's decorated, so timing
+    a call only reads the clock twice and adds to existing counters. while
+    disabled, a call costs one extra attribute check. timings are per
+    process, worker processes have their own
+    """
+
+    def __init__(self) -> None:
+        self._enabled = False
+        self._spans: dict[str, _Span] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self) -> None:
+        self._enabled = True
+
+    def disable(self) -> None:
+        self._enabled = False
+
+    def span[F: tp.Callable](self, name: str | None = None) -> tp.Callable[[F], F]:
+        """
+        time every call of the decorated function (or coroutine function,
+        in which case the time until it's done is measured, including
+        awaiting)
+
+        :param name: aggregate name, the functions qualified name if None.
+            functions with the same name share an aggregate
+        """
+        def decorator(func: F) -> F:
+            record = self._get_span(name or func.__qualname__)
+            profiler = self
+
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    if not profiler._enabled:
+                        return await func(*args, **kwargs)
+
+                    start = perf_counter_ns()
+                    try:
+                        return await func(*args, **kwargs)
+
+                    finally:
+                        record.add(perf_counter_ns() - start)
+
+                return tp.cast(F, async_wrapper)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not profiler._enabled:
+                    return func(*args, **kwargs)
+
+                start = perf_counter_ns()
+                try:
+                    return func(*args, **kwargs)
+
+                finally:
+                    record.add(perf_counter_ns() - start)
+
+            return tp.cast(F, wrapper)
+
+        return decorator
+
+    def _get_span(self, name: str) -> _Span:
+        """
+        get or create the aggregate of a name
+        """
+        # dict.setdefault is atomic, decorating from multiple threads is ok
+        return self._spans.setdefault(name, _Span(name))
+
+    def dump(self) -> dict[str, dict]:
+        """
+        timings of every span, sorted by total time (descending)
+
+        :returns: name -> calls, total, mean, min and max duration (ns)
+        """
+        spans = sorted(
+            self._spans.values(),
+            key=lambda s: s.total_ns,
+            reverse=True,
+        )
+        return {s.name: s.to_dict() for s in spans}
+
+    def reset(self) -> None:
+        """
+        clear all timings, the spans stay registered
+        """
+        for s in list(self._spans.values()):
+            s.reset()
+
+
+profiler = _Profiler()
@@ -24,10 +24,14 @@ def get_caller_name() -> str:
     return calframe[1][3]
 
 
-def print_ic_style(*values, sep=" ") -> None:
-    prefix = ic.prefix
-    if not isinstance(prefix, str):
-        prefix = prefix()
+def print_ic_style(*values, sep=" ", prefix: str | None = None) -> None:
+    """
+    :param prefix: icecream prefix, the current one if None
+    """
+    if prefix is None:
+        prefix = ic.prefix
+        if not isinstance(prefix, str):
+            prefix = prefix()
 
     prefix_time = prefix[:-3]
     prefix_arrow = prefix[-3:]
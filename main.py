@@ -6,7 +6,14 @@ from time import perf_counter
 
 from icecream import ic
 
-from iot_manager.core import DeviceBuffer, DeviceManager, HTTPServer, IOTDevice
+from iot_manager.core import (
+    DeviceBuffer,
+    DeviceManager,
+    HTTPServer,
+    IOTDevice,
+    PollEngine,
+    PollSpread,
+)
 from iot_manager.utils.debugging import DebugLevel, debugger
 
 SIGNALS: list[signal.Signals]
@@ -35,14 +42,21 @@ async def main() -> None:
     debugger.init(
         "./IOTManager.log",
         write_debug=True,
-        debug_level=DebugLevel.log
+        debug_level=DebugLevel.log,
+        background=True,
+        max_file_size=10 * 1024 * 1024,
+        json_file="./IOTManager.jsonl",
     )
 
     # manager
     dev_man = DeviceManager()
 
     # buffer
-    dev_buf = DeviceBuffer()
+    dev_buf = DeviceBuffer(
+        engine=PollEngine.ASYNC,
+        spread=PollSpread.PHASE,
+        snapshot_path="./IOTManager.snapshot",
+    )
 
     # add device 0 and 1 to request buffer
     dev_buf.add_device(dev_man.get_device(0), 2)
@@ -63,6 +77,7 @@ async def main() -> None:
         debugger.log("main: stopping program ...")
         dev_buf.shutdown()
         debugger.info("main: IOTManager stopped")
+        debugger.close()
 
     # register cleanup function for OS interrupts
     for s in SIGNALS:
@@ -71,7 +86,7 @@ async def main() -> None:
     debugger.info("main: IOTManager started")
 
     try:
-        await asyncio.gather(server.serve())
+        await asyncio.gather(server.serve(), dev_buf.run())
 
     except KeyboardInterrupt:
         cleanup()